@@ -10,19 +10,21 @@ Usage examples:
 
 import argparse
 import os
-import subprocess
 import sys
 
+from pipeline_runner import Stage, run_pipeline
+
 ROOT = os.path.dirname(os.path.abspath(__file__))
 PARENT = os.path.abspath(os.path.join(ROOT, ".."))
 
-def run_cmd(cmd, cwd=PARENT):
-    print(">>> Running:", cmd)
-    try:
-        subprocess.check_call(cmd, shell=True, cwd=cwd)
-    except subprocess.CalledProcessError as e:
-        print("Command failed with return code:", e.returncode)
-        sys.exit(e.returncode)
+def run_cmd(argv, cwd=PARENT):
+    """Run one command (argument list, no shell) and stream its output."""
+    print(">>> Running:", " ".join(argv))
+    name = os.path.basename(argv[-1])
+    result = run_pipeline([Stage(name, argv, cwd=cwd)])[name]
+    if not result.ok:
+        print("Command failed with return code:", result.returncode)
+        sys.exit(result.returncode or 1)
 
 def main():
     parser = argparse.ArgumentParser(description="Project launcher")
@@ -36,26 +38,26 @@ def main():
         vis_path = os.path.join(PARENT, "run_visualizations.sh")
 
         if os.path.isfile(etl_path):
-            run_cmd("bash run_etl.sh")
+            run_cmd(["bash", "run_etl.sh"])
         else:
             print("ETL script not found at", etl_path)
 
         if os.path.isfile(vis_path):
-            run_cmd("bash run_visualizations.sh")
+            run_cmd(["bash", "run_visualizations.sh"])
         else:
             print("Visualizations script not found at", vis_path)
 
     elif args.mode == "etl":
         etl_path = os.path.join(PARENT, "run_etl.sh")
         if os.path.isfile(etl_path):
-            run_cmd("bash run_etl.sh")
+            run_cmd(["bash", "run_etl.sh"])
         else:
             print("ETL script not found at", etl_path)
 
     elif args.mode == "visualize":
         vis_path = os.path.join(PARENT, "run_visualizations.sh")
         if os.path.isfile(vis_path):
-            run_cmd("bash run_visualizations.sh")
+            run_cmd(["bash", "run_visualizations.sh"])
         else:
             print("Visualizations script not found at", vis_path)
 
@@ -4,34 +4,76 @@
 简化的视频平台RFM分析系统主程序
 """
 
-import os
 import sys
-import subprocess
 import argparse
 
-def run_command(cmd, description):
-    """运行命令并显示结果"""
-    print(f"\n=== {description} ===")
-    print(f"执行命令: {cmd}")
-    try:
-        # 使用Python 3.6兼容的方式
-        result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode == 0:
-            print("✅ 执行成功")
-            if result.stdout:
-                print("输出:", result.stdout)
-        else:
-            print("❌ 执行失败")
-            print("错误:", result.stderr)
-        return result.returncode == 0
-    except Exception as e:
-        print(f"❌ 执行异常: {e}")
-        return False
+from pipeline_runner import Stage, run_pipeline, print_summary
+from watermark import WatermarkStore, discover_partitions, plan_incremental, record_results
+
+# 增量运行时的输入分区根目录与水位线/部分聚合状态
+INPUT_ROOT = '../data/events'
+WATERMARK_PATH = '../state/watermarks.json'
+PARTIALS_DIR = '../state/rfm_partials'
+
+def build_stages(mode, timeout=None, reference_date=None):
+    """按运行模式构建流水线阶段（依赖不在本次运行中的阶段视为已满足）"""
+    stages = []
+    
+    if mode in ['etl', 'all']:
+        # ETL流程：逐级依赖
+        stages += [
+            Stage('ddl', ['hive', '-f', '../sql_scripts/01_ddl_table_creation.hql'], "创建表结构", timeout=timeout),
+            Stage('cleaning', ['hive', '-f', '../sql_scripts/02_data_cleaning.hql'], "数据清洗",
+                  depends_on=['ddl'], timeout=timeout),
+            Stage('dimension', ['hive', '-f', '../sql_scripts/03_dimension_loading.hql'], "维度加载",
+                  depends_on=['cleaning'], timeout=timeout),
+            Stage('fact', ['hive', '-f', '../sql_scripts/04_fact_loading.hql'], "事实表加载",
+                  depends_on=['dimension'], timeout=timeout),
+        ]
+    
+    if mode in ['rfm', 'all']:
+        # RFM分析：三个分析互不依赖，可并发执行
+        stages += [
+            Stage('top', ['hive', '-f', '../sql_scripts/05_top_analysis.hql'], "RFM分析",
+                  depends_on=['fact'], timeout=timeout),
+            Stage('behavior', ['hive', '-f', '../sql_scripts/06_user_behavior.hql'], "用户行为分析",
+                  depends_on=['fact'], timeout=timeout),
+            Stage('retention', ['hive', '-f', '../sql_scripts/07_user_retention.hql'], "留存分析",
+                  depends_on=['fact'], timeout=timeout),
+        ]
+        if reference_date:
+            # 按分区增量的 RFM/留存聚合：只扫描新到或变化的分区
+            stages.append(Stage('rfm_aggregation', [
+                'python3', '../scripts/rfm_aggregation.py', '--input-root', INPUT_ROOT,
+                '--state-dir', PARTIALS_DIR, '--reference-date', reference_date,
+                '--output', '../results/rfm_table.csv', '--retention-output', '../results/retention.csv',
+            ], "增量RFM与留存聚合", depends_on=['cleaning'], timeout=timeout))
+    
+    if mode in ['viz', 'all']:
+        # 可视化：各自依赖对应的分析结果
+        stages += [
+            Stage('heatmap', ['python3', '../scripts/generate_heatmap.py'], "生成热力图",
+                  depends_on=['behavior'], timeout=timeout),
+            Stage('retention_curve', ['python3', '../scripts/generate_retention.py'], "生成留存曲线",
+                  depends_on=['retention'], timeout=timeout),
+            Stage('segmentation', ['python3', '../scripts/generate_segmentation.py'], "生成用户分群",
+                  depends_on=['top'], timeout=timeout),
+        ]
+    
+    return stages
 
 def main():
     parser = argparse.ArgumentParser(description='视频平台RFM分析系统')
     parser.add_argument('--mode', choices=['etl', 'rfm', 'viz', 'all'], 
                        default='all', help='运行模式')
+    parser.add_argument('--timeout', type=float, default=None,
+                       help='单个阶段的超时时间（秒）')
+    parser.add_argument('--max-parallel', type=int, default=3,
+                       help='同时运行的最大阶段数')
+    parser.add_argument('--incremental', action='store_true',
+                       help='按输入分区水位线增量运行：跳过输入无变化的阶段，其余只处理新分区')
+    parser.add_argument('--reference-date',
+                       help='提供时追加增量RFM/留存聚合阶段（recency 参考日期 YYYY-MM-DD）')
     
     args = parser.parse_args()
     
@@ -39,28 +81,20 @@ def main():
     print("视频平台RFM分析系统")
     print("=" * 50)
     
-    success = True
-    
-    if args.mode in ['etl', 'all']:
-        # ETL流程
-        success &= run_command("hive -f ../sql_scripts/01_ddl_table_creation.hql", "创建表结构")
-        success &= run_command("hive -f ../sql_scripts/02_data_cleaning.hql", "数据清洗")
-        success &= run_command("hive -f ../sql_scripts/03_dimension_loading.hql", "维度加载")
-        success &= run_command("hive -f ../sql_scripts/04_fact_loading.hql", "事实表加载")
-    
-    if args.mode in ['rfm', 'all']:
-        # RFM分析
-        success &= run_command("hive -f ../sql_scripts/05_top_analysis.hql", "RFM分析")
-        success &= run_command("hive -f ../sql_scripts/06_user_behavior.hql", "用户行为分析")
-        success &= run_command("hive -f ../sql_scripts/07_user_retention.hql", "留存分析")
+    stages = build_stages(args.mode, args.timeout, args.reference_date)
+    if args.incremental:
+        # 清洗阶段是分区数据的入口，下游阶段继承其输入；
+        # 待处理分区通过环境变量传入，HQL 中可用 ${env:PIPELINE_PARTITIONS} 引用
+        store = WatermarkStore(WATERMARK_PATH)
+        partitions = discover_partitions(INPUT_ROOT)
+        plan = plan_incremental(stages, store, {'cleaning': partitions})
     
-    if args.mode in ['viz', 'all']:
-        # 可视化
-        success &= run_command("python3 ../scripts/generate_heatmap.py", "生成热力图")
-        success &= run_command("python3 ../scripts/generate_retention.py", "生成留存曲线")
-        success &= run_command("python3 ../scripts/generate_segmentation.py", "生成用户分群")
+    results = run_pipeline(stages, max_parallel=args.max_parallel)
+    print_summary(results)
+    if args.incremental:
+        record_results(results, store, plan)
     
-    if success:
+    if all(result.ok for result in results.values()):
         print("\n🎉 所有任务执行完成！")
     else:
         print("\n⚠️ 部分任务执行失败，请检查日志")
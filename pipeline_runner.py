@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于 asyncio 的流水线执行器
+
+- 各阶段以异步子进程启动（参数列表，不经过 shell）
+- 输出逐行转发到终端，并加上 [阶段名] 前缀，不在内存中累积
+- 支持单阶段超时、Ctrl+C 取消，以及无依赖关系阶段的并发执行
+- 依赖阶段失败时，下游阶段标记为跳过
+- 设置了 skip 的阶段（如输入无变化，见 watermark.py）不执行，标记为已是最新
+"""
+
+import asyncio
+import sys
+import time
+
+SUCCESS = 'success'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+UP_TO_DATE = 'up-to-date'
+
+# 单行输出的最大长度，超长行会被截断而不是报错
+LINE_LIMIT = 1024 * 1024
+
+class Stage:
+    """流水线中的一个阶段"""
+
+    def __init__(self, name, argv, description=None, depends_on=(), timeout=None, cwd=None, env=None,
+                 skip=None):
+        self.name = name
+        self.argv = list(argv)
+        self.description = description or name
+        self.depends_on = list(depends_on)
+        self.timeout = timeout
+        self.cwd = cwd
+        self.env = env
+        # 非空时不执行该阶段，内容为跳过原因
+        self.skip = skip
+
+class StageResult:
+    """阶段执行结果"""
+
+    def __init__(self, stage, status, returncode=None, elapsed=0.0, message=''):
+        self.stage = stage
+        self.status = status
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.status in (SUCCESS, UP_TO_DATE)
+
+def _emit(name, text, stream=None):
+    stream = stream or sys.stdout
+    stream.write(f"[{name}] {text}\n")
+    stream.flush()
+
+def _emit_line(name, line, dropped):
+    text = line.decode(errors='replace').rstrip('\r')
+    if dropped:
+        text += f" ...(单行超过 {LINE_LIMIT} 字节，已截断 {dropped} 字节)"
+    _emit(name, text)
+
+async def _pump_output(stage, reader, read_size=65536):
+    """
+    逐行转发子进程输出
+
+    按块读取后自行切分行：超过 LINE_LIMIT 的行保留前 LINE_LIMIT 字节并加截断标记，
+    其余部分丢弃直到换行，不会被当作新的一行输出。
+    """
+    line = bytearray()
+    dropped = 0
+    while True:
+        data = await reader.read(read_size)
+        if not data:
+            break
+        start = 0
+        while start <= len(data):
+            end = data.find(b'\n', start)
+            piece = data[start:] if end < 0 else data[start:end]
+            room = max(LINE_LIMIT - len(line), 0)
+            line += piece[:room]
+            dropped += max(len(piece) - room, 0)
+            if end < 0:
+                break
+            _emit_line(stage.name, line, dropped)
+            line.clear()
+            dropped = 0
+            start = end + 1
+    if line or dropped:
+        _emit_line(stage.name, line, dropped)
+
+async def _terminate(process, grace=5.0):
+    """先 terminate，宽限期后仍未退出则 kill"""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), grace)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+async def _run_stage(stage, semaphore):
+    async with semaphore:
+        _emit(stage.name, f"=== {stage.description} ===")
+        _emit(stage.name, "执行命令: " + " ".join(stage.argv))
+        started = time.monotonic()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *stage.argv, cwd=stage.cwd, env=stage.env,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                limit=LINE_LIMIT)
+        except OSError as e:
+            _emit(stage.name, f"❌ 启动失败: {e}")
+            return StageResult(stage, FAILED, message=str(e))
+
+        async def pump_and_wait():
+            await _pump_output(stage, process.stdout)
+            return await process.wait()
+
+        try:
+            returncode = await asyncio.wait_for(pump_and_wait(), stage.timeout)
+        except asyncio.TimeoutError:
+            await _terminate(process)
+            _emit(stage.name, f"❌ 超时（{stage.timeout}s），已终止")
+            return StageResult(stage, TIMEOUT, process.returncode, time.monotonic() - started)
+        except asyncio.CancelledError:
+            await _terminate(process)
+            _emit(stage.name, "⚠️ 已取消")
+            raise
+
+        elapsed = time.monotonic() - started
+        if returncode == 0:
+            _emit(stage.name, f"✅ 执行成功（{elapsed:.1f}s）")
+            return StageResult(stage, SUCCESS, returncode, elapsed)
+        _emit(stage.name, f"❌ 执行失败，返回码 {returncode}")
+        return StageResult(stage, FAILED, returncode, elapsed)
+
+async def _run_after_dependencies(stage, tasks, semaphore):
+    if stage.skip:
+        _emit(stage.name, f"⏭ 已是最新：{stage.skip}")
+        return StageResult(stage, UP_TO_DATE, message=stage.skip)
+    dependencies = [tasks[name] for name in stage.depends_on if name in tasks]
+    if dependencies:
+        results = await asyncio.gather(*dependencies)
+        failed = [r.stage.name for r in results if not r.ok]
+        if failed:
+            _emit(stage.name, "⏭ 跳过：依赖阶段未成功 " + ", ".join(failed))
+            return StageResult(stage, SKIPPED, message=", ".join(failed))
+    return await _run_stage(stage, semaphore)
+
+async def _run_all(stages, max_parallel):
+    semaphore = asyncio.Semaphore(max_parallel)
+    tasks = {}
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(_run_after_dependencies(stage, tasks, semaphore))
+    try:
+        return await asyncio.gather(*tasks.values())
+    except asyncio.CancelledError:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+def run_pipeline(stages, max_parallel=4):
+    """
+    执行流水线
+
+    Args:
+        stages: Stage 列表，依赖只能引用排在前面的阶段；
+                依赖不在列表中的阶段视为已满足
+        max_parallel: 同时运行的最大阶段数
+
+    Returns:
+        {阶段名: StageResult}，按 stages 顺序
+    """
+    # 依赖只允许指向列表中更早的阶段，保证无环
+    names = {stage.name for stage in stages}
+    seen = set()
+    for stage in stages:
+        later = [name for name in stage.depends_on if name in names and name not in seen]
+        if later:
+            raise ValueError(f"阶段 {stage.name} 依赖的阶段必须排在它之前: {later}")
+        seen.add(stage.name)
+
+    # 兼容 Python 3.6：不使用 asyncio.run
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    main_task = loop.create_task(_run_all(stages, max_parallel))
+    try:
+        results = loop.run_until_complete(main_task)
+    except KeyboardInterrupt:
+        main_task.cancel()
+        try:
+            loop.run_until_complete(main_task)
+        except asyncio.CancelledError:
+            pass
+        print("\n⚠️ 已中断，所有运行中的阶段已终止")
+        results = [StageResult(stage, CANCELLED) for stage in stages]
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    return {result.stage.name: result for result in results}
+
+def print_summary(results):
+    """打印各阶段执行情况"""
+    print("\n阶段执行汇总:")
+    for name, result in results.items():
+        print(f"  {name:<20} {result.status:<10} {result.elapsed:>8.1f}s")
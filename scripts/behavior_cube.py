@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行为聚合立方体
+对应 ER 图中的星型模型：把事实表按 分群 × 小时 × 内容类别 × 日期 预聚合为
+稠密数组（观看次数与观看时长之和），星期维由日期维折叠得到，不单独存储。
+热力图、分布图与分群对比直接从立方体切片汇总，无需重新扫描事实数据。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 对外提供的维度；weekday 由 day 折叠得到
+DIMENSIONS = ('segment', 'hour', 'weekday', 'category', 'day')
+STORED_DIMENSIONS = ('segment', 'hour', 'category', 'day')
+MEASURES = ('count', 'duration')
+
+class BehaviorCube:
+    """分群 × 小时 × 内容类别 × 日期 的计数与时长立方体"""
+
+    def __init__(self, segments, categories, start_day, n_days):
+        self.segments = list(segments)
+        self.categories = list(categories)
+        self.start_day = np.datetime64(start_day, 'D')
+        self.n_days = int(n_days)
+        self.shape = (len(self.segments), 24, len(self.categories), self.n_days)
+        self.counts = np.zeros(self.shape, dtype=np.int64)
+        self.duration = np.zeros(self.shape, dtype=np.float64)
+        self.dropped = 0
+
+    @property
+    def days(self):
+        return self.start_day + np.arange(self.n_days)
+
+    def add(self, segment_codes, event_time, category_codes, duration=None):
+        """
+        累加一块事件
+
+        Args:
+            segment_codes: 分群编码（-1 表示未知，丢弃）
+            event_time: 事件时间（可转换为 datetime64 的数组）
+            category_codes: 内容类别编码（-1 表示未知，丢弃）
+            duration: 观看时长，None 表示只计次数
+        """
+        event_time = np.asarray(event_time, dtype='datetime64[s]')
+        segment_codes = np.asarray(segment_codes, dtype=np.int64)
+        category_codes = np.asarray(category_codes, dtype=np.int64)
+
+        day = (event_time.astype('datetime64[D]') - self.start_day).astype(np.int64)
+        hour = (event_time - event_time.astype('datetime64[D]')).astype(np.int64) // 3600
+        valid = ((segment_codes >= 0) & (category_codes >= 0)
+                 & (day >= 0) & (day < self.n_days) & ~np.isnat(event_time))
+        self.dropped += int(len(valid) - valid.sum())
+
+        flat = np.ravel_multi_index(
+            (segment_codes[valid], hour[valid], category_codes[valid], day[valid]), self.shape)
+        size = self.counts.size
+        self.counts += np.bincount(flat, minlength=size).reshape(self.shape)
+        if duration is not None:
+            weights = np.asarray(duration, dtype=np.float64)[valid]
+            self.duration += np.bincount(flat, weights=np.nan_to_num(weights), minlength=size).reshape(self.shape)
+
+    def add_frame(self, events, segment_column='segment', time_column='event_time',
+                  category_column='category', duration_column='watch_duration'):
+        """从 DataFrame 累加一块事件（分群与类别为名称）"""
+        self.add(
+            pd.Categorical(events[segment_column], categories=self.segments).codes,
+            pd.to_datetime(events[time_column]).to_numpy(),
+            pd.Categorical(events[category_column], categories=self.categories).codes,
+            events[duration_column].to_numpy() if duration_column in events else None)
+
+    def merge(self, other):
+        """合并另一个同维度的立方体（如其它分片）"""
+        if (self.segments != other.segments or self.categories != other.categories
+                or self.start_day != other.start_day or self.n_days != other.n_days):
+            raise ValueError("立方体维度不一致，无法合并")
+        self.counts += other.counts
+        self.duration += other.duration
+        self.dropped += other.dropped
+        return self
+
+    def _index(self, dimension, values):
+        """把某一存储维度的标签或下标转为整数下标"""
+        values = np.atleast_1d(values)
+        if values.dtype.kind in 'iu':
+            return values.astype(np.int64)
+        if dimension == 'day':
+            return (values.astype('datetime64[D]') - self.start_day).astype(np.int64)
+        labels = self.segments if dimension == 'segment' else self.categories
+        return np.array([labels.index(v) for v in values], dtype=np.int64)
+
+    def rollup(self, keep=('hour', 'weekday'), where=None, measure='count'):
+        """
+        汇总立方体
+
+        Args:
+            keep: 保留的维度（按给定顺序排列），取自 DIMENSIONS
+            where: {维度: 取值或取值列表}，取值可为标签或下标；weekday 取 0(周一)~6
+            measure: 'count' 或 'duration'
+
+        Returns:
+            ndarray，形状与 keep 对应
+        """
+        keep = list(keep)
+        where = dict(where or {})
+        unknown = [d for d in keep + list(where) if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"未知维度: {unknown}")
+        if 'weekday' in keep and 'day' in keep:
+            raise ValueError("weekday 与 day 不能同时保留")
+        if measure not in MEASURES:
+            raise ValueError(f"未知指标: {measure}")
+
+        array = self.counts if measure == 'count' else self.duration
+        weekday_filter = where.pop('weekday', None)
+        for dimension, values in where.items():
+            array = np.take(array, self._index(dimension, values),
+                            axis=STORED_DIMENSIONS.index(dimension))
+
+        dims = list(STORED_DIMENSIONS)
+        if 'weekday' in keep or weekday_filter is not None:
+            # 把日期维折叠为星期维（datetime64 纪元 1970-01-01 为周四）
+            weekday = (self.days.astype(np.int64) + 3) % 7
+            if 'day' in where:
+                weekday = weekday[self._index('day', where['day'])]
+            array = np.stack([array[..., weekday == d].sum(axis=-1) for d in range(7)], axis=-1)
+            dims[-1] = 'weekday'
+            if weekday_filter is not None:
+                array = np.take(array, np.atleast_1d(weekday_filter), axis=-1)
+
+        drop_axes = tuple(i for i, d in enumerate(dims) if d not in keep)
+        array = array.sum(axis=drop_axes)
+        remaining = [d for d in dims if d in keep]
+        return np.transpose(array, [remaining.index(d) for d in keep])
+
+    def save(self, path):
+        """保存为 npz（不依赖 pickle）"""
+        np.savez_compressed(
+            path, counts=self.counts, duration=self.duration,
+            segments=np.array(self.segments, dtype=str), categories=np.array(self.categories, dtype=str),
+            start_day=np.array(str(self.start_day)), n_days=np.array(self.n_days),
+            dropped=np.array(self.dropped))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            cube = cls(data['segments'].tolist(), data['categories'].tolist(),
+                       str(data['start_day']), int(data['n_days']))
+            cube.counts = data['counts']
+            cube.duration = data['duration']
+            cube.dropped = int(data['dropped'])
+        return cube
+
+def build_cube(path, segments, categories, start_day, n_days, user_segments,
+               content_categories, chunksize=500000):
+    """
+    从清洗后的行为日志构建立方体
+
+    Args:
+        path: 行为日志 CSV（user_id, event_time, watch_duration, content_id）
+        segments, categories: 维度取值
+        start_day, n_days: 日期维范围
+        user_segments: user_id -> 分群名 的映射（dict 或 Series）
+        content_categories: content_id -> 类别名 的映射（dict 或 Series）
+    """
+    cube = BehaviorCube(segments, categories, start_day, n_days)
+    user_segments = pd.Series(user_segments)
+    content_categories = pd.Series(content_categories)
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk['segment'] = chunk['user_id'].map(user_segments)
+        chunk['category'] = chunk['content_id'].map(content_categories)
+        cube.add_frame(chunk)
+    return cube
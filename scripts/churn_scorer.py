@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线流失风险打分
+为每个用户维护按时间指数衰减的活跃分与最近活跃时间，每条事件 O(1) 更新，
+无需等待批量重新聚类即可从实时事件流中标记流失风险用户。
+
+状态按编码后的用户下标存放在数组中（分数与时间各一列），
+定期以 npz 快照持久化（先写临时文件再原子替换），重启时从快照恢复后继续回放。
+
+    python scripts/churn_scorer.py --input data/behaviors.csv --snapshot state/churn.npz --output results/at_risk.csv
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from npz_io import save_npz_atomic
+
+SECONDS_PER_DAY = 86400.0
+DEFAULT_HALF_LIFE_DAYS = 7.0
+DEFAULT_RISK_SCORE = 0.5
+DEFAULT_INACTIVE_DAYS = 14
+
+class ChurnScorer:
+    """
+    指数衰减活跃分
+
+    用户的活跃分 s 在 t 时刻的取值为 Σ w_i · exp(-λ (t - t_i))，λ = ln2 / 半衰期。
+    只需保存“截至最近活跃时间的分数”与最近活跃时间，任意时刻的分数按需衰减得到。
+    """
+
+    def __init__(self, half_life_days=DEFAULT_HALF_LIFE_DAYS, risk_score=DEFAULT_RISK_SCORE,
+                 inactive_days=DEFAULT_INACTIVE_DAYS, capacity=1024):
+        self.half_life_days = half_life_days
+        self.decay = np.log(2) / (half_life_days * SECONDS_PER_DAY)
+        self.risk_score = risk_score
+        self.inactive_days = inactive_days
+        self.user_index = {}
+        self.user_ids = []
+        self.scores = np.zeros(capacity, dtype=np.float64)
+        # 未出现过的用户最近活跃时间为 -inf，旧分数 0 衰减后仍为 0
+        self.last_seen = np.full(capacity, -np.inf)
+        self.events = 0
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _grow(self, size):
+        if size <= len(self.scores):
+            return
+        capacity = max(size, 2 * len(self.scores))
+        for name, fill in (('scores', 0.0), ('last_seen', -np.inf)):
+            old = getattr(self, name)
+            grown = np.full(capacity, fill)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _encode(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self._grow(len(self.user_ids))
+        return row
+
+    def update(self, user_id, timestamp, weight=1.0):
+        """单条事件更新（timestamp 为秒级 Unix 时间）"""
+        row = self._encode(user_id)
+        last = self.last_seen[row]
+        if timestamp >= last:
+            self.scores[row] = self.scores[row] * np.exp(-self.decay * (timestamp - last)) + weight
+            self.last_seen[row] = timestamp
+        else:
+            # 乱序事件：衰减到已记录的最近活跃时间后再累加
+            self.scores[row] += weight * np.exp(-self.decay * (last - timestamp))
+        self.events += 1
+
+    def update_batch(self, user_ids, timestamps, weights=None):
+        """
+        向量化批量更新，结果与逐条调用 update 相同
+
+        先把每个用户的参考时间取为 max(已记录时间, 本批最大时间)，
+        旧分数与本批各事件都衰减到参考时间后相加。
+        """
+        user_ids = pd.Series(user_ids)
+        codes, uniques = pd.factorize(user_ids)
+        if len(codes) == 0:
+            return
+        # factorize 已给出本批去重后的用户，字典查找只对每个用户做一次
+        touched = np.array([self._encode(user_id) for user_id in uniques], dtype=np.intp)
+        inverse = codes
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        reference = self.last_seen[touched].copy()
+        np.maximum.at(reference, inverse, timestamps)
+        contributions = np.bincount(
+            inverse, weights=weights * np.exp(-self.decay * (reference[inverse] - timestamps)),
+            minlength=len(touched))
+        self.scores[touched] = (self.scores[touched] * np.exp(-self.decay * (reference - self.last_seen[touched]))
+                                + contributions)
+        self.last_seen[touched] = reference
+        self.events += len(codes)
+
+    def current_scores(self, now):
+        """所有用户在 now 时刻的衰减活跃分"""
+        n = len(self)
+        return self.scores[:n] * np.exp(-self.decay * np.maximum(now - self.last_seen[:n], 0))
+
+    def score(self, user_id, now):
+        row = self.user_index.get(user_id)
+        if row is None:
+            return 0.0
+        return float(self.scores[row] * np.exp(-self.decay * max(now - self.last_seen[row], 0)))
+
+    def at_risk(self, now):
+        """活跃分低于 risk_score 或超过 inactive_days 未活跃的用户"""
+        scores = self.current_scores(now)
+        days_inactive = (now - self.last_seen[:len(self)]) / SECONDS_PER_DAY
+        mask = (scores < self.risk_score) | (days_inactive > self.inactive_days)
+        rows = np.flatnonzero(mask)
+        return pd.DataFrame({
+            'user_id': [self.user_ids[row] for row in rows],
+            'score': scores[rows],
+            'days_inactive': days_inactive[rows],
+            'last_seen': pd.to_datetime(self.last_seen[rows], unit='s'),
+        }).sort_values('score', ignore_index=True)
+
+    def save(self, path):
+        """写 npz 快照（不依赖 pickle），先写临时文件再原子替换"""
+        n = len(self)
+        save_npz_atomic(path, user_ids=np.array(self.user_ids), scores=self.scores[:n],
+                        last_seen=self.last_seen[:n], events=np.array(self.events),
+                        params=np.array([self.half_life_days, self.risk_score, self.inactive_days]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            half_life_days, risk_score, inactive_days = data['params'].tolist()
+            scorer = cls(half_life_days, risk_score, inactive_days, capacity=max(len(data['scores']), 1))
+            scorer.user_ids = data['user_ids'].tolist()
+            scorer.user_index = {user_id: row for row, user_id in enumerate(scorer.user_ids)}
+            scorer.scores[:len(scorer.user_ids)] = data['scores']
+            scorer.last_seen[:len(scorer.user_ids)] = data['last_seen']
+            scorer.events = int(data['events'])
+        return scorer
+
+def to_unix_seconds(event_time):
+    """事件时间列转为秒级 Unix 时间（float64）"""
+    return pd.to_datetime(event_time).to_numpy('datetime64[ns]').astype(np.int64) / 1e9
+
+def replay(path, scorer=None, chunksize=100000, snapshot_path=None, snapshot_every=1000000,
+           user_column='user_id', time_column='event_time'):
+    """
+    按块回放本地事件文件（CSV 或 '-' 表示标准输入）
+
+    Args:
+        scorer: 已有的打分器（如从快照恢复）；None 时新建
+        snapshot_path: 快照路径，每处理 snapshot_every 条事件及结束时各写一次
+
+    Returns:
+        scorer, 最后一条事件的时间（秒）
+    """
+    scorer = ChurnScorer() if scorer is None else scorer
+    source = sys.stdin if path == '-' else path
+    since_snapshot = 0
+    latest = scorer.last_seen[:len(scorer)].max() if len(scorer) else -np.inf
+    for chunk in pd.read_csv(source, chunksize=chunksize, usecols=[user_column, time_column]):
+        chunk = chunk.dropna()
+        timestamps = to_unix_seconds(chunk[time_column])
+        scorer.update_batch(chunk[user_column].to_numpy(), timestamps)
+        if len(timestamps):
+            latest = max(latest, timestamps.max())
+        since_snapshot += len(chunk)
+        if snapshot_path and since_snapshot >= snapshot_every:
+            scorer.save(snapshot_path)
+            since_snapshot = 0
+    if snapshot_path:
+        scorer.save(snapshot_path)
+    return scorer, latest
+
+def main():
+    parser = argparse.ArgumentParser(description='在线流失风险打分')
+    parser.add_argument('--input', required=True, help="行为日志 CSV，'-' 表示从标准输入读取")
+    parser.add_argument('--snapshot', help='状态快照路径（存在时先恢复）')
+    parser.add_argument('--snapshot-every', type=int, default=1000000, help='每处理多少条事件写一次快照')
+    parser.add_argument('--half-life', type=float,
+                        help=f'活跃分半衰期（天），默认 {DEFAULT_HALF_LIFE_DAYS}；须与快照一致')
+    parser.add_argument('--risk-score', type=float, help=f'风险分阈值，默认 {DEFAULT_RISK_SCORE}；可覆盖快照中的值')
+    parser.add_argument('--inactive-days', type=float, help=f'不活跃天数阈值，默认 {DEFAULT_INACTIVE_DAYS}；可覆盖快照中的值')
+    parser.add_argument('--now', help='评估时刻，默认取最后一条事件的时间')
+    parser.add_argument('--output', help='流失风险用户 CSV')
+    args = parser.parse_args()
+
+    if args.snapshot and os.path.exists(args.snapshot):
+        scorer = ChurnScorer.load(args.snapshot)
+        print(f"从快照恢复: {len(scorer)} 个用户，{scorer.events} 条事件")
+        # 已保存的分数按快照的半衰期衰减，无法换算；判定阈值只影响 at_risk，可直接覆盖
+        if args.half_life is not None and args.half_life != scorer.half_life_days:
+            parser.error(f"快照的半衰期为 {scorer.half_life_days} 天，与 --half-life {args.half_life} 不一致；"
+                         "更换半衰期需不带快照重新回放")
+        if args.risk_score is not None:
+            scorer.risk_score = args.risk_score
+        if args.inactive_days is not None:
+            scorer.inactive_days = args.inactive_days
+    else:
+        scorer = ChurnScorer(
+            DEFAULT_HALF_LIFE_DAYS if args.half_life is None else args.half_life,
+            DEFAULT_RISK_SCORE if args.risk_score is None else args.risk_score,
+            DEFAULT_INACTIVE_DAYS if args.inactive_days is None else args.inactive_days)
+
+    scorer, latest = replay(args.input, scorer, snapshot_path=args.snapshot,
+                            snapshot_every=args.snapshot_every)
+    now = to_unix_seconds(pd.Series([args.now]))[0] if args.now else latest
+    at_risk = scorer.at_risk(now)
+    print(f"用户数: {len(scorer)}  事件数: {scorer.events}  流失风险用户: {len(at_risk)}")
+    if args.output:
+        at_risk.to_csv(args.output, index=False)
+        print(f"✅ 已保存: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式数据质量校验与清洗
+对行为日志分块扫描：统计缺失率、格式错误，按 Welford 算法合并各块的
+数值列均值/方差，执行缺失值填充、3σ 异常值过滤与格式标准化，
+同时输出清洗后的数据与质量报告。
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['watch_duration', 'amount']
+# 参与 3σ 过滤的列（amount 为零膨胀分布，不做过滤）
+OUTLIER_COLUMNS = ['watch_duration']
+REQUIRED_COLUMNS = ['user_id', 'event_time']
+TIME_COLUMN = 'event_time'
+# 缺失时使用固定值填充的列，其余数值列用过滤异常值后的均值填充
+DEFAULT_FILL_VALUES = {'amount': 0.0}
+
+class RunningStats:
+    """按列维护的 Welford 运行均值/方差，可逐块合并"""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = np.zeros(len(self.columns))
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros(len(self.columns))
+
+    def update(self, index, values):
+        """用一块数据更新第 index 列的统计量（Chan 合并公式）"""
+        values = values[~np.isnan(values)]
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        n_a = self.count[index]
+        n = n_a + n_b
+        delta = mean_b - self.mean[index]
+        self.mean[index] += delta * n_b / n
+        self.m2[index] += m2_b + delta ** 2 * n_a * n_b / n
+        self.count[index] = n
+
+    def std(self, index):
+        """第 index 列的总体标准差"""
+        if self.count[index] < 2:
+            return np.nan
+        return float(np.sqrt(self.m2[index] / self.count[index]))
+
+def _parsed_chunks(input_path, chunksize, numeric_columns, required_columns, checked_columns,
+                   columns_only=False):
+    """
+    分块读取并完成缺失统计、格式解析与必填列过滤（清洗步骤 1~3）
+
+    columns_only=True 时只读取需要校验的列（统计扫描用）。
+
+    Yields:
+        chunk: 丢弃必填列无效行后的数据块（数值列为 float，时间列为 datetime）
+        counts: {'rows', 'missing'（按列缺失数）, 'type_errors'（按列格式错误数）, 'dropped'}
+    """
+    usecols = (lambda column: column in checked_columns) if columns_only else None
+    for chunk in pd.read_csv(input_path, chunksize=chunksize, dtype=str,
+                             keep_default_na=False, usecols=usecols):
+        rows = len(chunk)
+        for column in checked_columns:
+            if column not in chunk.columns:
+                chunk[column] = None
+
+        # 1. 缺失值统计（空字符串视为缺失）
+        for column in checked_columns:
+            chunk[column] = chunk[column].where(chunk[column].str.strip() != '')
+        missing = chunk[checked_columns].isna()
+        type_errors = pd.Series(0, index=checked_columns)
+
+        # 2. 格式校验：数值列与时间列
+        for column in numeric_columns:
+            parsed = pd.to_numeric(chunk[column], errors='coerce')
+            # inf 等非有限值同样视为格式错误
+            parsed = parsed.where(np.isfinite(parsed.to_numpy(dtype=np.float64)))
+            type_errors[column] += int((parsed.isna() & ~missing[column]).sum())
+            chunk[column] = parsed
+        if TIME_COLUMN in chunk.columns:
+            parsed = pd.to_datetime(chunk[TIME_COLUMN], errors='coerce')
+            if TIME_COLUMN in checked_columns:
+                type_errors[TIME_COLUMN] += int((parsed.isna() & ~missing[TIME_COLUMN]).sum())
+            chunk[TIME_COLUMN] = parsed
+
+        # 3. 必填列缺失或格式错误的行直接丢弃
+        valid = chunk[required_columns].notna().all(axis=1)
+        yield chunk[valid], {'rows': rows, 'missing': missing.sum(), 'type_errors': type_errors,
+                             'dropped': int((~valid).sum())}
+
+def _outlier_masks(chunk, numeric_columns, outlier_columns, stats, sigma):
+    """按全局统计量判定各列的 3σ 异常值，返回 {列名: 布尔数组}"""
+    masks = {}
+    for i, column in enumerate(numeric_columns):
+        std = stats.std(i)
+        if column not in outlier_columns or np.isnan(std) or std == 0:
+            continue
+        values = chunk[column].to_numpy(dtype=np.float64)
+        masks[column] = np.abs(values - stats.mean[i]) > sigma * std
+    return masks
+
+def clean_events(input_path, output_path=None, chunksize=500000, sigma=3.0,
+                 numeric_columns=None, required_columns=None, fill_values=None,
+                 outlier_columns=None):
+    """
+    分块扫描完成行为日志的校验与清洗
+
+    结果与分块方式、数据顺序无关：
+    第一遍统计必填列有效行的全局均值与标准差，供 3σ 过滤；
+    第二遍（有数值列需要用均值填充时）统计过滤后数据的均值，作为填充值；
+    最后一遍执行过滤、填充与输出。统计扫描只读取需要校验的列。
+
+    Args:
+        input_path: 原始行为日志 CSV
+        output_path: 清洗后 CSV 输出路径，None 表示只生成报告
+        chunksize: 每块行数
+        sigma: 异常值过滤阈值（标准差倍数）
+        numeric_columns: 需要校验的数值列
+        required_columns: 缺失或格式错误即丢弃整行的列
+        fill_values: 数值列缺失时的固定填充值，其余列用过滤后的均值
+        outlier_columns: 参与 3σ 过滤的数值列
+
+    Returns:
+        dict: 质量报告
+    """
+    numeric_columns = list(numeric_columns or NUMERIC_COLUMNS)
+    required_columns = list(required_columns or REQUIRED_COLUMNS)
+    fill_values = dict(DEFAULT_FILL_VALUES if fill_values is None else fill_values)
+    outlier_columns = list(OUTLIER_COLUMNS if outlier_columns is None else outlier_columns)
+    checked_columns = required_columns + [c for c in numeric_columns if c not in required_columns]
+    parse_args = (input_path, chunksize, numeric_columns, required_columns, checked_columns)
+
+    # 第一遍：全局统计量（3σ 过滤用）
+    stats = RunningStats(numeric_columns)
+    for chunk, _ in _parsed_chunks(*parse_args, columns_only=True):
+        for i, column in enumerate(numeric_columns):
+            stats.update(i, chunk[column].to_numpy(dtype=np.float64))
+
+    # 第二遍：过滤后数据的统计量，用于缺失值填充，避免被异常值拉偏
+    clean_stats = RunningStats(numeric_columns)
+    if any(column not in fill_values for column in numeric_columns):
+        for chunk, _ in _parsed_chunks(*parse_args, columns_only=True):
+            keep = np.ones(len(chunk), dtype=bool)
+            for is_outlier in _outlier_masks(chunk, numeric_columns, outlier_columns, stats, sigma).values():
+                keep &= ~is_outlier
+            for i, column in enumerate(numeric_columns):
+                clean_stats.update(i, chunk[column].to_numpy(dtype=np.float64)[keep])
+    fills = {column: fill_values.get(column, clean_stats.mean[i]) for i, column in enumerate(numeric_columns)}
+
+    rows_in = rows_out = 0
+    dropped_required = 0
+    nulls_before = pd.Series(0, index=checked_columns)
+    type_errors = pd.Series(0, index=checked_columns)
+    outliers = pd.Series(0, index=numeric_columns)
+    nulls_after = 0
+    filled = pd.Series(0, index=numeric_columns)
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    header = True
+
+    for chunk, counts in _parsed_chunks(*parse_args):
+        rows_in += counts['rows']
+        nulls_before += counts['missing']
+        type_errors += counts['type_errors']
+        dropped_required += counts['dropped']
+
+        # 4. 3σ 过滤
+        keep = np.ones(len(chunk), dtype=bool)
+        for column, is_outlier in _outlier_masks(chunk, numeric_columns, outlier_columns, stats, sigma).items():
+            outliers[column] += int(is_outlier.sum())
+            keep &= ~is_outlier
+        chunk = chunk[keep]
+
+        # 5. 缺失值填充
+        for column in numeric_columns:
+            filled[column] += int(chunk[column].isna().sum())
+            chunk[column] = chunk[column].fillna(fills[column])
+
+        nulls_after += int(chunk[checked_columns].isna().sum().sum())
+        rows_out += len(chunk)
+
+        # 6. 标准化格式后输出
+        if output_path:
+            chunk = chunk.copy()
+            if TIME_COLUMN in chunk.columns and pd.api.types.is_datetime64_any_dtype(chunk[TIME_COLUMN]):
+                chunk[TIME_COLUMN] = chunk[TIME_COLUMN].dt.strftime('%Y-%m-%dT%H:%M:%S')
+            chunk.to_csv(output_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+
+    cells_in = max(rows_in * len(checked_columns), 1)
+    cells_out = max(rows_out * len(checked_columns), 1)
+    # 原始数据中非缺失单元格通过格式校验的比例
+    present = rows_in * len(checked_columns) - int(nulls_before.sum())
+    report = {
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'rows_dropped_required': dropped_required,
+        'before': {
+            'missing_rate': float(nulls_before.sum() / cells_in),
+            'invalid_format_rate': float(type_errors.sum() / cells_in),
+            'valid_format_rate': float(1 - type_errors.sum() / present) if present else 0.0,
+            'outlier_rate': float(outliers.sum() / max(rows_in, 1)),
+        },
+        'after': {
+            'missing_rate': float(nulls_after / cells_out),
+            'retained_rate': float(rows_out / max(rows_in, 1)),
+        },
+        'columns': {},
+    }
+    for column in checked_columns:
+        info = {
+            'null_rate': float(nulls_before[column] / max(rows_in, 1)),
+            'type_error_rate': float(type_errors[column] / max(rows_in, 1)),
+        }
+        if column in numeric_columns:
+            i = numeric_columns.index(column)
+            info.update({
+                'mean': float(stats.mean[i]),
+                'std': stats.std(i),
+                'clean_mean': float(clean_stats.mean[i]),
+                'clean_std': clean_stats.std(i),
+                'outliers': int(outliers[column]),
+                'filled': int(filled[column]),
+            })
+        report['columns'][column] = info
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='行为日志流式清洗')
+    parser.add_argument('--input', required=True, help='原始行为日志 CSV')
+    parser.add_argument('--output', help='清洗后 CSV 输出路径')
+    parser.add_argument('--report', help='质量报告 JSON 输出路径')
+    parser.add_argument('--chunksize', type=int, default=500000)
+    parser.add_argument('--sigma', type=float, default=3.0)
+    args = parser.parse_args()
+
+    report = clean_events(args.input, args.output, chunksize=args.chunksize, sigma=args.sigma)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -12,28 +12,67 @@ from matplotlib.patches import FancyBboxPatch
 import numpy as np
 import pandas as pd
 import os
+import tempfile
+
+from data_cleaning import clean_events
+from streaming_hist import BinnedHistogram, IntegerHistogram
 
 def setup_english_fonts():
     """设置英文字体"""
     plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 10
 
-def generate_data_cleaning_flow():
+def simulate_raw_events(path, n_events=20000, seed=42):
+    """生成带缺失、格式错误与异常值的模拟原始行为日志"""
+    rng = np.random.default_rng(seed)
+    
+    events = pd.DataFrame({
+        'user_id': [f'u{i:05d}' for i in rng.integers(0, 2000, n_events)],
+        'event_time': (pd.Timestamp('2025-10-01')
+                       + pd.to_timedelta(rng.integers(0, 30 * 86400, n_events), unit='s')
+                       ).strftime('%Y-%m-%dT%H:%M:%S'),
+        'watch_duration': np.round(rng.lognormal(3.5, 0.5, n_events), 1).astype(str),
+        'amount': np.where(rng.random(n_events) < 0.1, np.round(rng.gamma(2, 5, n_events), 2), 0.0).astype(str),
+        'content_id': [f'vid_{i}' for i in rng.integers(1000, 1500, n_events)],
+    })
+    
+    # 注入缺失值、格式错误与异常值
+    for column in ['user_id', 'event_time', 'watch_duration', 'amount']:
+        events.loc[rng.random(n_events) < 0.04, column] = ''
+    events.loc[rng.random(n_events) < 0.03, 'event_time'] = 'not-a-time'
+    events.loc[rng.random(n_events) < 0.03, 'watch_duration'] = 'N/A'
+    events.loc[rng.random(n_events) < 0.02, 'watch_duration'] = '99999'
+    
+    events.to_csv(path, index=False)
+    return path
+
+def generate_data_cleaning_flow(report=None):
     """生成数据清洗流程图"""
     setup_english_fonts()
     
+    # 质量报告来自清洗阶段本身；未提供时对模拟日志执行一次清洗
+    if report is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = simulate_raw_events(os.path.join(tmp_dir, 'raw_events.csv'))
+            report = clean_events(raw_path, chunksize=5000)
+    before, after = report['before'], report['after']
+    
     fig, ax = plt.subplots(1, 1, figsize=(16, 8))
     
     # 定义流程步骤
     steps = [
         {"name": "Raw Data", "x": 0.1, "color": "lightcoral", 
-         "details": ["Missing values: 15%", "Invalid format: 8%", "Outliers: 12%"]},
+         "details": [f"Missing values: {before['missing_rate']:.1%}",
+                     f"Invalid format: {before['invalid_format_rate']:.1%}",
+                     f"Outliers: {before['outlier_rate']:.1%}"]},
         {"name": "Data Cleaning", "x": 0.3, "color": "lightblue", 
          "details": ["Fill missing values", "Filter outliers (3σ)", "Standardize format"]},
         {"name": "Quality Check", "x": 0.5, "color": "lightgreen", 
          "details": ["Validate data types", "Check constraints", "Verify relationships"]},
         {"name": "Cleaned Data", "x": 0.7, "color": "lightyellow", 
-         "details": ["Missing values: 2%", "Valid format: 98%", "Outliers: 3%"]}
+         "details": [f"Missing values: {after['missing_rate']:.1%}",
+                     f"Rows dropped (required): {report['rows_dropped_required']}",
+                     f"Rows kept: {report['rows_out']}/{report['rows_in']}"]}
     ]
     
     # 绘制流程步骤
@@ -63,8 +102,9 @@ def generate_data_cleaning_flow():
     
     # 添加质量改进标注
     ax.text(0.1, 0.15, "Before Cleaning:", fontsize=10, weight='bold')
-    ax.text(0.1, 0.1, "• Missing: 15% → 2%", fontsize=9)
-    ax.text(0.1, 0.05, "• Valid format: 85% → 98%", fontsize=9)
+    ax.text(0.1, 0.1, f"• Missing: {before['missing_rate']:.1%} → {after['missing_rate']:.1%}", fontsize=9)
+    ax.text(0.1, 0.05, f"• Valid format (non-missing raw cells): {before['valid_format_rate']:.1%}",
+            fontsize=9)
     
     ax.set_xlim(0, 1)
     ax.set_ylim(0, 1)
@@ -77,31 +117,65 @@ def generate_data_cleaning_flow():
     plt.close()
     print("✅ 数据清洗流程图已生成: docs/exploration/data_cleaning_flow.png")
 
-def generate_basic_features():
-    """生成用户行为基础特征分布图"""
+def simulate_feature_histograms(n_users=1000, chunksize=250, seed=42):
+    """
+    按块模拟用户特征并累加到直方图（不保留原始数组）
+    
+    Returns:
+        {'watch_duration': 对数分箱直方图, 'watch_frequency': 整数直方图,
+         'active_days': 线性分箱直方图}
+    """
+    rng = np.random.RandomState(seed)
+    histograms = {
+        'watch_duration': BinnedHistogram.log(1, 1000, bins=50),
+        'watch_frequency': IntegerHistogram(max_value=30),
+        'active_days': BinnedHistogram.linear(0, 7, bins=30),
+    }
+    for start in range(0, n_users, chunksize):
+        size = min(chunksize, n_users - start)
+        histograms['watch_duration'].add(rng.lognormal(3.5, 0.8, size))  # 对数正态分布
+        histograms['watch_frequency'].add(rng.poisson(3, size))  # 泊松分布
+        histograms['active_days'].add(rng.beta(2, 5, size) * 7)  # Beta分布
+    return histograms
+
+def _plot_histogram(ax, histogram, **kwargs):
+    """按分箱画直方图（分箱宽度可不等）"""
+    ax.bar(histogram.edges[:-1], histogram.counts, width=histogram.widths, align='edge', **kwargs)
+
+def generate_basic_features(cube=None, histograms=None):
+    """
+    生成用户行为基础特征分布图
+    
+    Args:
+        cube: 可选的 BehaviorCube，提供时时段热力图直接由立方体汇总
+        histograms: 可选的流式直方图（键同 simulate_feature_histograms），
+                    可由各分片合并得到；None 时使用模拟数据
+    """
     setup_english_fonts()
     
     # 生成示例数据
     np.random.seed(42)
+    histograms = histograms or simulate_feature_histograms()
     
     # 创建子图
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
     
-    # 子图1: 用户观看时长分布
-    watch_duration = np.random.lognormal(3.5, 0.8, 1000)  # 对数正态分布
-    axes[0,0].hist(watch_duration, bins=50, alpha=0.7, color='skyblue', edgecolor='black')
+    # 子图1: 用户观看时长分布（对数分箱，中位数由分箱近似）
+    duration_hist = histograms['watch_duration']
+    _plot_histogram(axes[0,0], duration_hist, alpha=0.7, color='skyblue', edgecolor='black')
+    axes[0,0].set_xscale('log')
     axes[0,0].set_title('User Watch Duration Distribution', fontsize=12)
-    axes[0,0].set_xlabel('Watch Duration (minutes)')
+    axes[0,0].set_xlabel('Watch Duration (minutes, log scale)')
     axes[0,0].set_ylabel('User Count')
     axes[0,0].grid(True, alpha=0.3)
-    axes[0,0].axvline(np.median(watch_duration), color='red', linestyle='--', 
-                     label=f'Median: {np.median(watch_duration):.1f} min')
+    median_duration = duration_hist.median()
+    axes[0,0].axvline(median_duration, color='red', linestyle='--', 
+                     label=f'Median: {median_duration:.1f} min')
     axes[0,0].legend()
     
     # 子图2: 用户观看频次分布
-    watch_frequency = np.random.poisson(3, 1000)  # 泊松分布
-    freq_counts = pd.Series(watch_frequency).value_counts().sort_index()
-    axes[0,1].bar(freq_counts.index, freq_counts.values, alpha=0.7, color='lightgreen')
+    freq_values, freq_counts = histograms['watch_frequency'].nonzero()
+    axes[0,1].bar(freq_values, freq_counts, alpha=0.7, color='lightgreen')
     axes[0,1].set_title('User Watch Frequency Distribution', fontsize=12)
     axes[0,1].set_xlabel('Weekly Watch Count')
     axes[0,1].set_ylabel('User Count')
@@ -111,18 +185,21 @@ def generate_basic_features():
     hours = list(range(24))
     days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
     
-    # 创建时段数据（晚间高峰）
-    data = np.zeros((24, 7))
-    for h in range(24):
-        for d in range(7):
-            # 晚间19-22点高峰，周末更高
-            base = 50 if d < 5 else 80  # 工作日 vs 周末
-            if 19 <= h <= 22:
-                data[h, d] = base + np.random.randint(50, 100)
-            elif 12 <= h <= 14:
-                data[h, d] = base + np.random.randint(20, 50)
-            else:
-                data[h, d] = base + np.random.randint(0, 30)
+    # 时段数据：优先由行为立方体汇总，否则模拟（晚间高峰）
+    if cube is not None:
+        data = cube.rollup(keep=('hour', 'weekday'))
+    else:
+        data = np.zeros((24, 7))
+        for h in range(24):
+            for d in range(7):
+                # 晚间19-22点高峰，周末更高
+                base = 50 if d < 5 else 80  # 工作日 vs 周末
+                if 19 <= h <= 22:
+                    data[h, d] = base + np.random.randint(50, 100)
+                elif 12 <= h <= 14:
+                    data[h, d] = base + np.random.randint(20, 50)
+                else:
+                    data[h, d] = base + np.random.randint(0, 30)
     
     im = axes[1,0].imshow(data, cmap='YlOrRd', aspect='auto')
     axes[1,0].set_xticks(range(7))
@@ -135,8 +212,7 @@ def generate_basic_features():
     plt.colorbar(im, ax=axes[1,0], label='Watch Sessions')
     
     # 子图4: 用户活跃度分布
-    active_days = np.random.beta(2, 5, 1000) * 7  # Beta分布
-    axes[1,1].hist(active_days, bins=30, alpha=0.7, color='lightcoral', edgecolor='black')
+    _plot_histogram(axes[1,1], histograms['active_days'], alpha=0.7, color='lightcoral', edgecolor='black')
     axes[1,1].set_title('User Active Days Distribution', fontsize=12)
     axes[1,1].set_xlabel('Active Days per Week')
     axes[1,1].set_ylabel('User Count')
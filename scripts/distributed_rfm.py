@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多节点 RFM 聚合（协调者 / 工作节点）
+协调者把输入分片（分区目录或文件）分配给通过 TCP 连接的工作节点，
+工作节点用 rfm_aggregation.aggregate_partition 扫描分片并只返回按用户的部分聚合数组，
+协调者合并部分聚合后用 RFMScorer 打分。分片失败（连接断开、超时或工作节点报错）会重新排队，
+交给其它工作节点重试；吞吐随工作节点数增加。
+
+消息格式：8 字节长度头（JSON 头长度 uint32 + 数组负载长度 uint64，大端），
+随后是 UTF-8 JSON 头与 npz 负载（不使用 pickle）。分片路径须对工作节点可见（如共享存储）。
+协议没有认证：工作节点默认只监听 127.0.0.1；监听其它地址时必须用 --data-root
+限定可读取的目录，该目录之外的分片路径一律拒绝。
+
+    # 每个节点启动工作进程
+    python scripts/distributed_rfm.py worker --host 0.0.0.0 --port 9100 --data-root /mnt/shared/events
+    # 协调者
+    python scripts/distributed_rfm.py coordinator --input-root data/events --workers node1:9100 node2:9100 \\
+        --reference-date 2025-10-22 --output results/segments.csv
+    # 单机测试：启动 4 个本地工作进程
+    python scripts/distributed_rfm.py coordinator --input-root data/events --local-workers 4 \\
+        --reference-date 2025-10-22 --output results/segments.csv
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from npz_io import plain_arrays
+from rfm_aggregation import aggregate_partition, merge_partials, rfm_table
+
+_FRAME = struct.Struct('>IQ')
+DEFAULT_TIMEOUT = 600.0
+# 协调者打分只需要的部分聚合数组（不传回留存用的活跃对）
+RESULT_KEYS = ('user_ids', 'last_seen', 'first_seen', 'frequency', 'monetary')
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("连接已关闭")
+        received += n
+    return bytes(buffer)
+
+def send_message(sock, header, arrays=None):
+    """发送一条消息：JSON 头 + 可选的数组字典（npz 编码）"""
+    payload = b''
+    if arrays:
+        out = io.BytesIO()
+        np.savez(out, **plain_arrays(arrays))
+        payload = out.getvalue()
+    head = json.dumps(header).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(head), len(payload)) + head)
+    if payload:
+        sock.sendall(payload)
+
+def recv_message(sock):
+    """接收一条消息，返回 (header, arrays)"""
+    head_size, payload_size = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_size).decode('utf-8'))
+    arrays = {}
+    if payload_size:
+        with np.load(io.BytesIO(_recv_exact(sock, payload_size)), allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+    return header, arrays
+
+def _within(path, root):
+    """path 是否位于 root 目录内（解析符号链接后比较）"""
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return os.path.commonpath([path, root]) == root
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    """处理协调者的一条连接，可连续执行多个分片"""
+
+    def handle(self):
+        while True:
+            try:
+                header, _ = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            op = header.get('op')
+            if op == 'ping':
+                send_message(self.request, {'status': 'ok', 'pid': os.getpid()})
+            elif op == 'aggregate':
+                started = time.monotonic()
+                data_root = self.server.data_root
+                if data_root and not _within(header['shard'], data_root):
+                    send_message(self.request, {'status': 'error', 'shard': header['shard'],
+                                                'message': f"分片不在数据目录 {data_root} 内"})
+                    continue
+                try:
+                    partial = aggregate_partition(header['shard'], **header.get('params', {}))
+                except Exception as e:
+                    send_message(self.request, {'status': 'error', 'shard': header['shard'],
+                                                'message': f"{type(e).__name__}: {e}"})
+                    continue
+                send_message(self.request, {'status': 'ok', 'shard': header['shard'],
+                                            'users': len(partial['user_ids']),
+                                            'elapsed': time.monotonic() - started},
+                             {key: partial[key] for key in RESULT_KEYS})
+            elif op == 'shutdown':
+                send_message(self.request, {'status': 'ok'})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            else:
+                send_message(self.request, {'status': 'error', 'message': f"未知操作: {op}"})
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    data_root = None
+
+def serve(host='127.0.0.1', port=9100, data_root=None):
+    """
+    启动工作节点（阻塞）；port=0 时自动分配端口，实际端口打印到标准输出
+
+    Args:
+        data_root: 只允许读取该目录内的分片；监听非本机地址时必须提供
+    """
+    if host not in LOOPBACK_HOSTS and not data_root:
+        raise ValueError(f"监听 {host} 时必须指定 data_root，限定可读取的目录")
+    with _WorkerServer((host, port), _WorkerHandler) as server:
+        server.data_root = data_root
+        print(f"LISTENING {server.server_address[0]}:{server.server_address[1]}", flush=True)
+        server.serve_forever()
+
+def spawn_local_workers(n, host='127.0.0.1'):
+    """
+    启动 n 个本地工作进程
+
+    Returns:
+        processes, addresses: 子进程列表与 (host, port) 列表
+    """
+    processes, addresses = [], []
+    for _ in range(n):
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '--host', host, '--port', '0'],
+                                   stdout=subprocess.PIPE, text=True)
+        line = process.stdout.readline().split()
+        if len(line) != 2 or line[0] != 'LISTENING':
+            process.kill()
+            raise RuntimeError("本地工作进程启动失败")
+        worker_host, port = line[1].rsplit(':', 1)
+        processes.append(process)
+        addresses.append((worker_host, int(port)))
+    return processes, addresses
+
+def stop_workers(addresses, timeout=5.0):
+    """通知工作节点退出（无法连接的忽略）"""
+    for address in addresses:
+        try:
+            with socket.create_connection(address, timeout=timeout) as sock:
+                send_message(sock, {'op': 'shutdown'})
+                recv_message(sock)
+        except OSError:
+            pass
+
+def run_shards(shards, workers, params=None, retries=2, timeout=DEFAULT_TIMEOUT, connect_timeout=10.0):
+    """
+    把分片分配给工作节点并收集部分聚合
+
+    每个工作节点一个线程，从共享队列领取分片；分片失败后重新排队（最多 retries 次），
+    连接失败或回复无法解析的工作节点不再领取分片。
+
+    Args:
+        shards: 分片路径列表
+        workers: (host, port) 列表
+        params: 传给 aggregate_partition 的参数（列名等）
+        timeout: 单个分片的最长等待时间（秒）
+
+    Returns:
+        partials: 部分聚合列表（与成功的分片一一对应）
+        report: {'shards', 'failed', 'retried', 'per_worker'}
+    """
+    pending = queue.Queue()
+    for shard in shards:
+        pending.put((shard, 0))
+    remaining = [len(shards)]
+    lock = threading.Lock()
+    done = threading.Event()
+    if not shards:
+        done.set()
+    partials, failed = [], []
+    report = {'shards': len(shards), 'retried': 0, 'per_worker': {}}
+    alive = [len(workers)]
+
+    def finish_one():
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            done.set()
+
+    def worker_loop(address):
+        name = f"{address[0]}:{address[1]}"
+        report['per_worker'][name] = 0
+        sock = None
+        try:
+            while not done.is_set():
+                try:
+                    shard, attempt = pending.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                try:
+                    if sock is None:
+                        sock = socket.create_connection(address, timeout=connect_timeout)
+                        sock.settimeout(timeout)
+                    send_message(sock, {'op': 'aggregate', 'shard': shard, 'params': params or {}})
+                    header, arrays = recv_message(sock)
+                    if not isinstance(header, dict):
+                        raise ValueError(f"无法识别的回复头: {header!r}")
+                except Exception as e:
+                    # 连接、超时或回复格式错误（JSON/npz 解析失败等）：分片退回队列，本工作节点退出
+                    with lock:
+                        _requeue(shard, attempt, f"{name}: {type(e).__name__}: {e}")
+                    return
+                with lock:
+                    if header.get('status') == 'ok':
+                        partials.append(arrays)
+                        report['per_worker'][name] += 1
+                        finish_one()
+                    else:
+                        _requeue(shard, attempt, f"{name}: {header.get('message')}")
+        finally:
+            if sock is not None:
+                sock.close()
+            with lock:
+                alive[0] -= 1
+                if alive[0] == 0:
+                    done.set()
+
+    def _requeue(shard, attempt, message):
+        print(f"⚠️ 分片失败 {shard}（第 {attempt + 1} 次）: {message}")
+        if attempt < retries:
+            report['retried'] += 1
+            pending.put((shard, attempt + 1))
+        else:
+            failed.append(shard)
+            finish_one()
+
+    threads = [threading.Thread(target=worker_loop, args=(address,), daemon=True) for address in workers]
+    for thread in threads:
+        thread.start()
+    done.wait()
+    for thread in threads:
+        thread.join()
+
+    # 所有工作节点都不可用时，队列中剩余的分片记为失败
+    while not pending.empty():
+        failed.append(pending.get()[0])
+    report['failed'] = failed
+    return partials, report
+
+def list_shards(input_root):
+    """输入根目录下的一级分区（目录或文件）作为分片"""
+    return [os.path.join(input_root, name) for name in sorted(os.listdir(input_root))
+            if not name.startswith(('.', '_'))]
+
+def main():
+    parser = argparse.ArgumentParser(description='多节点 RFM 聚合')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    worker_parser = subparsers.add_parser('worker', help='启动工作节点')
+    worker_parser.add_argument('--host', default='127.0.0.1')
+    worker_parser.add_argument('--port', type=int, default=9100)
+    worker_parser.add_argument('--data-root', help='只允许读取该目录内的分片（监听非本机地址时必填）')
+
+    coordinator_parser = subparsers.add_parser('coordinator', help='分配分片、合并并打分')
+    coordinator_parser.add_argument('--input-root', required=True, help='按分区存放的行为日志根目录')
+    coordinator_parser.add_argument('--workers', nargs='*', default=[], help='工作节点 host:port')
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help='额外启动的本地工作进程数')
+    coordinator_parser.add_argument('--reference-date', required=True)
+    coordinator_parser.add_argument('--monetary-column', default='watch_duration')
+    coordinator_parser.add_argument('--config', default='config/rfm_config.yaml')
+    coordinator_parser.add_argument('--retries', type=int, default=2)
+    coordinator_parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    coordinator_parser.add_argument('--output', required=True, help='分群结果 CSV')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        if args.host not in LOOPBACK_HOSTS and not args.data_root:
+            parser.error(f"监听 {args.host} 时必须指定 --data-root")
+        serve(args.host, args.port, args.data_root)
+        return
+
+    addresses = [(host, int(port)) for host, port in (w.rsplit(':', 1) for w in args.workers)]
+    processes = []
+    if args.local_workers:
+        processes, local = spawn_local_workers(args.local_workers)
+        addresses += local
+    if not addresses:
+        parser.error("至少需要一个工作节点（--workers 或 --local-workers）")
+
+    try:
+        started = time.monotonic()
+        partials, report = run_shards(list_shards(args.input_root), addresses,
+                                      {'monetary_column': args.monetary_column},
+                                      retries=args.retries, timeout=args.timeout)
+        print(f"聚合完成: {report['shards'] - len(report['failed'])}/{report['shards']} 个分片，"
+              f"重试 {report['retried']} 次，用时 {time.monotonic() - started:.1f}s")
+        for name, count in report['per_worker'].items():
+            print(f"  {name:<24} {count} 个分片")
+    finally:
+        if processes:
+            stop_workers(addresses[-len(processes):])
+            for process in processes:
+                process.wait(timeout=10)
+
+    if report['failed']:
+        print("❌ 以下分片多次重试后仍失败:\n  " + "\n  ".join(report['failed']))
+        sys.exit(1)
+
+    from rfm_scoring import RFMScorer
+
+    rfm = rfm_table(merge_partials(partials), args.reference_date)
+    scorer = RFMScorer.from_yaml(args.config)
+    scorer.fit(rfm['recency'], rfm['frequency'], rfm['monetary'])
+    segments = scorer.score_frame(rfm)
+    segments.to_csv(args.output, index=False)
+    print(f"✅ 分群结果已保存: {args.output}（{len(segments)} 个用户）")
+    print(segments['segment'].value_counts().to_string())
+
+if __name__ == "__main__":
+    main()
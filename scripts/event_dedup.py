@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行为日志去重（外存哈希分区）
+客户端 SDK 重试会产生重复事件，导致 F、M 指标虚高。
+先按 (user_id, event_time, content_id) 的哈希把事件分到磁盘桶中，
+再在固定内存预算内并行地对每个桶独立去重，可处理远大于内存的数据集。
+默认按桶的顺序输出（同一桶内保持输入顺序），preserve_order=True 时
+按输入行号多路归并各桶结果，输出与输入顺序一致。
+
+建议在 data_cleaning.clean_events 之后运行，此时 event_time 已统一格式。
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+KEY_COLUMNS = ['user_id', 'event_time', 'content_id']
+# preserve_order 时记录输入行号的临时列
+ROW_COLUMN = '_dedup_row'
+
+# CSV 读入 pandas 后的内存膨胀系数（字符串列的经验值）
+MEMORY_EXPANSION = 8
+
+def choose_bucket_count(input_bytes, memory_budget, workers):
+    """根据输入大小与内存预算估算桶数，保证并行时各桶之和不超预算"""
+    per_worker = max(memory_budget // max(workers, 1), 1)
+    return max(1, math.ceil(input_bytes * MEMORY_EXPANSION / per_worker))
+
+def partition_events(input_path, bucket_dir, n_buckets, chunksize=500000, key_columns=None,
+                     row_numbers=False):
+    """
+    第一遍：按键哈希把事件写入 n_buckets 个磁盘桶
+
+    row_numbers=True 时在首列写入输入行号（ROW_COLUMN），供输出时恢复输入顺序。
+
+    Returns:
+        (总行数, 已写入的桶文件列表)
+    """
+    key_columns = list(key_columns or KEY_COLUMNS)
+    os.makedirs(bucket_dir, exist_ok=True)
+    written = set()
+    rows = 0
+
+    for chunk in pd.read_csv(input_path, chunksize=chunksize, dtype=str, keep_default_na=False):
+        if row_numbers:
+            chunk.insert(0, ROW_COLUMN, range(rows, rows + len(chunk)))
+        rows += len(chunk)
+        hashes = pd.util.hash_pandas_object(chunk[key_columns], index=False).to_numpy()
+        buckets = hashes % n_buckets
+        for bucket, part in chunk.groupby(buckets, sort=False):
+            path = os.path.join(bucket_dir, f'bucket-{int(bucket):05d}.csv')
+            part.to_csv(path, mode='a', header=path not in written, index=False)
+            written.add(path)
+
+    return rows, sorted(written)
+
+def dedup_bucket(args):
+    """第二遍：对单个桶去重，保留每个键第一次出现的事件"""
+    bucket_path, output_path, key_columns = args
+    events = pd.read_csv(bucket_path, dtype=str, keep_default_na=False)
+    unique = events.drop_duplicates(subset=key_columns, keep='first')
+    unique.to_csv(output_path, index=False)
+    return len(events), len(unique)
+
+def _merge_results(result_paths, out, preserve_order):
+    """把各桶结果（均含表头）的数据行写入 out；preserve_order 时按首列行号归并并去掉该列"""
+    files = [open(path, encoding='utf-8', newline='') for path in result_paths]
+    try:
+        for part in files:
+            part.readline()
+        if not preserve_order:
+            for part in files:
+                shutil.copyfileobj(part, out)
+            return
+        # 每个桶内行号递增，多路归并即可恢复全局顺序，内存只与桶数有关
+        writer = csv.writer(out, lineterminator=os.linesep)
+        for row in heapq.merge(*(csv.reader(part) for part in files), key=lambda row: int(row[0])):
+            writer.writerow(row[1:])
+    finally:
+        for part in files:
+            part.close()
+
+def dedup_events(input_path, output_path, memory_budget=2 * 1024 ** 3, workers=None,
+                 n_buckets=None, chunksize=500000, key_columns=None, work_dir=None,
+                 preserve_order=False):
+    """
+    外存去重行为日志
+
+    Args:
+        input_path: 输入 CSV
+        output_path: 去重后 CSV
+        memory_budget: 所有工作进程合计的内存预算（字节）
+        workers: 并行进程数，默认 CPU 核数
+        n_buckets: 桶数，默认按输入大小与内存预算估算
+        chunksize: 分区阶段每块行数
+        key_columns: 去重键
+        work_dir: 桶文件所在目录，默认系统临时目录
+        preserve_order: 输出是否保持输入顺序；否则按桶的顺序输出（桶内保持输入顺序）
+
+    Returns:
+        dict: 去重报告
+    """
+    key_columns = list(key_columns or KEY_COLUMNS)
+    workers = workers or os.cpu_count() or 1
+    if n_buckets is None:
+        n_buckets = choose_bucket_count(os.path.getsize(input_path), memory_budget, workers)
+
+    columns = pd.read_csv(input_path, nrows=0, dtype=str).columns.tolist()
+    tmp_dir = tempfile.mkdtemp(prefix='dedup-', dir=work_dir)
+    try:
+        bucket_dir = os.path.join(tmp_dir, 'buckets')
+        result_dir = os.path.join(tmp_dir, 'results')
+        os.makedirs(result_dir)
+
+        rows_in, bucket_paths = partition_events(
+            input_path, bucket_dir, n_buckets, chunksize=chunksize, key_columns=key_columns,
+            row_numbers=preserve_order)
+
+        tasks = [(path, os.path.join(result_dir, os.path.basename(path)), key_columns)
+                 for path in bucket_paths]
+        if workers == 1:
+            counts = [dedup_bucket(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                counts = list(executor.map(dedup_bucket, tasks))
+
+        # 表头总是来自输入文件（只有表头的输入也会输出表头），随后合并各桶的数据行
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8', newline='') as out:
+            pd.DataFrame(columns=columns).to_csv(out, index=False)
+            _merge_results([result_path for _, result_path, _ in tasks], out, preserve_order)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    rows_out = sum(unique for _, unique in counts)
+    duplicates = rows_in - rows_out
+    bucket_rates = [(total - unique) / total for total, unique in counts if total]
+    return {
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'duplicates': duplicates,
+        'duplicate_rate': duplicates / rows_in if rows_in else 0.0,
+        'n_buckets': n_buckets,
+        'max_bucket_rows': max((total for total, _ in counts), default=0),
+        'max_bucket_duplicate_rate': max(bucket_rates, default=0.0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='行为日志外存去重')
+    parser.add_argument('--input', required=True, help='输入 CSV')
+    parser.add_argument('--output', required=True, help='去重后 CSV')
+    parser.add_argument('--memory-mb', type=int, default=2048, help='内存预算（MB）')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--buckets', type=int, default=None)
+    parser.add_argument('--preserve-order', action='store_true', help='输出保持输入顺序（默认按桶的顺序）')
+    args = parser.parse_args()
+
+    report = dedup_events(args.input, args.output, memory_budget=args.memory_mb * 1024 ** 2,
+                          workers=args.workers, n_buckets=args.buckets, preserve_order=args.preserve_order)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
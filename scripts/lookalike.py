@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似人群（Lookalike）检索
+在标准化后的 RFM + 行为特征空间上建立 KD 树，支持批量 k 近邻与半径查询
+（scipy cKDTree，workers=-1 时多线程并行），可为一批种子用户（如 1 万高价值用户）
+找出最相似的候选人群，不再局限于 4 个固定聚类。
+
+索引以 npz 保存标准化参数与特征矩阵（不依赖 pickle），加载后按同样参数重建树。
+
+    python scripts/lookalike.py build --input results/user_features.csv --index models/lookalike.npz
+    python scripts/lookalike.py query --index models/lookalike.npz --seeds seeds.csv --size 50000 --output lookalike.csv
+"""
+
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from npz_io import save_npz_atomic
+from user_clustering import feature_matrix, scale_inplace
+
+FEATURE_COLUMNS = ['Recency', 'Frequency', 'Monetary', 'ActiveDays', 'Tenure']
+INDEX_VERSION = 1
+DEFAULT_BATCH_SIZE = 100000
+
+class LookalikeIndex:
+    """
+    标准化特征空间上的 KD 树索引
+
+    Attributes:
+        columns: 特征列名
+        mean, scale: 标准化参数
+        weights: 各特征的权重（标准化后再乘），默认全为 1
+        features: 标准化并加权后的特征矩阵（float32）
+        user_ids: 与 features 行对应的用户 ID
+    """
+
+    def __init__(self, features, user_ids, columns, mean, scale, weights=None, leafsize=32):
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.user_ids = np.asarray(user_ids)
+        if len(self.user_ids) != len(self.features):
+            raise ValueError("用户 ID 与特征矩阵行数不一致")
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.weights = np.ones(len(self.columns)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.leafsize = leafsize
+        self.tree = cKDTree(self.features, leafsize=leafsize)
+        self._positions = pd.Index(self.user_ids)
+
+    def __len__(self):
+        return len(self.features)
+
+    @classmethod
+    def build(cls, df, columns=None, id_column='user_id', weights=None, leafsize=32):
+        """
+        由用户特征表建立索引
+
+        Args:
+            df: 用户特征表
+            columns: 特征列，默认 FEATURE_COLUMNS
+            id_column: 用户 ID 列；None 或不存在时使用行号
+            weights: {列名: 权重}，用于调整各特征在距离中的重要性
+        """
+        columns = columns or FEATURE_COLUMNS
+        features = feature_matrix(df, columns)
+        mean, scale = scale_inplace(features)
+        weight_array = np.array([(weights or {}).get(column, 1.0) for column in columns])
+        features *= weight_array.astype(np.float32)
+        user_ids = df[id_column].to_numpy() if id_column and id_column in df else np.arange(len(df))
+        return cls(features, user_ids, columns, mean, scale, weight_array, leafsize)
+
+    def transform(self, features):
+        """把原始尺度的特征（DataFrame 或数组）变换到索引空间"""
+        if isinstance(features, pd.DataFrame):
+            matrix = feature_matrix(features, self.columns)
+        else:
+            matrix = np.array(features, dtype=np.float32, ndmin=2)
+        matrix -= self.mean.astype(np.float32)
+        matrix /= (self.scale / self.weights).astype(np.float32)
+        return matrix
+
+    def positions(self, user_ids):
+        """用户 ID 转为索引中的行号，不存在的为 -1"""
+        return self._positions.get_indexer(np.asarray(user_ids))
+
+    def knn(self, points, k=10, workers=-1, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        批量 k 近邻
+
+        Args:
+            points: 索引空间中的查询点 (n, d)，原始特征请先 transform
+            workers: 并行线程数，-1 为全部 CPU
+
+        Returns:
+            distances (n, k) float32, indices (n, k) 行号
+        """
+        points = np.asarray(points)
+        k = min(k, len(self))
+        distances = np.empty((len(points), k), dtype=np.float32)
+        indices = np.empty((len(points), k), dtype=np.intp)
+        for start in range(0, len(points), batch_size):
+            stop = start + batch_size
+            d, i = self.tree.query(points[start:stop], k=k, workers=workers)
+            distances[start:stop] = np.reshape(d, (-1, k))
+            indices[start:stop] = np.reshape(i, (-1, k))
+        return distances, indices
+
+    def radius(self, points, r, workers=-1, return_length=False):
+        """批量半径查询：每个查询点返回半径 r 内的行号数组（或仅返回个数）"""
+        return self.tree.query_ball_point(np.asarray(points), r, workers=workers,
+                                          return_sorted=False, return_length=return_length)
+
+    def lookalike(self, seed_ids, size=10000, k=None, exclude_seeds=True, workers=-1):
+        """
+        为种子人群检索相似用户
+
+        每个种子取 k 个近邻，候选用户按到最近种子的距离排序，
+        hits 为把该用户列为近邻的种子数（越多越“典型”）。
+
+        Args:
+            seed_ids: 种子用户 ID（须在索引中）
+            size: 返回的相似用户数
+            k: 每个种子的近邻数，默认按 size 与种子数自动估计
+
+        Returns:
+            DataFrame: user_id, distance, hits（按距离升序）
+        """
+        seeds = self.positions(seed_ids)
+        missing = int((seeds < 0).sum())
+        seeds = np.unique(seeds[seeds >= 0])
+        if not len(seeds):
+            raise ValueError("种子用户均不在索引中")
+        if missing:
+            warnings.warn(f"{missing} 个种子用户不在索引中，已忽略", stacklevel=2)
+
+        if k is None:
+            # 近邻会大量重叠，取平均份额的数倍
+            k = int(np.clip(4 * size / len(seeds), 10, 1000))
+        distances, indices = self.knn(self.features[seeds], k + (1 if exclude_seeds else 0), workers)
+        distances, indices = distances.ravel(), indices.ravel()
+        if exclude_seeds:
+            keep = ~np.isin(indices, seeds)
+            distances, indices = distances[keep], indices[keep]
+
+        # 按 (行号, 距离) 排序后，每个候选的首行即最近距离
+        order = np.lexsort((distances, indices))
+        indices, distances = indices[order], distances[order]
+        first = np.flatnonzero(np.r_[True, indices[1:] != indices[:-1]])
+        hits = np.diff(np.r_[first, len(indices)])
+        candidates, nearest = indices[first], distances[first]
+
+        top = np.argsort(nearest, kind='stable')[:size]
+        return pd.DataFrame({'user_id': self.user_ids[candidates[top]],
+                             'distance': nearest[top], 'hits': hits[top]})
+
+    def save(self, path):
+        """保存为 npz，先写临时文件再原子替换"""
+        save_npz_atomic(path, version=np.array(INDEX_VERSION), features=self.features, user_ids=self.user_ids,
+                        columns=np.array(self.columns, dtype=str), mean=self.mean, scale=self.scale,
+                        weights=self.weights, leafsize=np.array(self.leafsize))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data['version'])
+            if version > INDEX_VERSION:
+                raise ValueError(f"索引版本 {version} 高于当前支持的版本 {INDEX_VERSION}")
+            return cls(data['features'], data['user_ids'], data['columns'].tolist(), data['mean'],
+                       data['scale'], data['weights'], int(data['leafsize']))
+
+def main():
+    parser = argparse.ArgumentParser(description='相似人群检索')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    build_parser = subparsers.add_parser('build', help='由用户特征表建立并保存索引')
+    build_parser.add_argument('--input', required=True, help='用户特征 CSV')
+    build_parser.add_argument('--index', required=True, help='索引文件路径（.npz）')
+    build_parser.add_argument('--columns', nargs='+', default=FEATURE_COLUMNS)
+    build_parser.add_argument('--id-column', default='user_id')
+
+    query_parser = subparsers.add_parser('query', help='为种子人群检索相似用户')
+    query_parser.add_argument('--index', required=True)
+    query_parser.add_argument('--seeds', required=True, help='种子用户 CSV（含 user_id 列）')
+    query_parser.add_argument('--size', type=int, default=10000)
+    query_parser.add_argument('--k', type=int, help='每个种子的近邻数')
+    query_parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = LookalikeIndex.build(pd.read_csv(args.input), args.columns, args.id_column)
+        index.save(args.index)
+        print(f"✅ 索引已保存: {args.index}（{len(index)} 个用户，{len(index.columns)} 维特征）")
+    else:
+        index = LookalikeIndex.load(args.index)
+        seeds = pd.read_csv(args.seeds)['user_id'].to_numpy()
+        result = index.lookalike(seeds, size=args.size, k=args.k)
+        result.to_csv(args.output, index=False)
+        print(f"✅ 相似用户已保存: {args.output}（{len(result)} 个）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+npz 读写的公共函数
+模型、索引、快照与部分聚合都保存为 npz，且加载时使用 allow_pickle=False：
+object 数组（如字符串用户 ID）先转为定长字符串，文件先写临时路径再原子替换，
+写到一半中断也不会留下损坏的文件。
+"""
+
+import os
+
+import numpy as np
+
+def plain_arrays(arrays):
+    """把 object 数组转为定长字符串，使 npz 不依赖 pickle；其它数组原样返回"""
+    plain = {}
+    for key, value in arrays.items():
+        value = np.asarray(value)
+        plain[key] = value.astype(str) if value.dtype == object else value
+    return plain
+
+def save_npz_atomic(path, **arrays):
+    """保存为未压缩的 npz：自动创建目录，先写临时文件再原子替换"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **plain_arrays(arrays))
+    os.replace(tmp_path, path)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分区、带版本的 Parquet 结果存储
+每次运行的每用户 RFM、打分与分群结果按 运行日期 / 分群 分区写入：
+
+    results/
+      run_date=2025-10-22/
+        _manifest.json
+        segment=Champions/part-0.parquet
+        segment=Lost/part-0.parquet
+        ...
+
+读取单个分群或单次运行时无需扫描其它分区，旧运行可按目录直接删除。
+依赖 pyarrow。
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SCHEMA_VERSION = '1.0'
+MANIFEST_NAME = '_manifest.json'
+RUN_PREFIX = 'run_date='
+SEGMENT_PREFIX = 'segment='
+# 分群为空的行单独写入该分区（沿用 Hive 对空分区值的命名），读取时还原为空值
+NULL_SEGMENT = '__HIVE_DEFAULT_PARTITION__'
+
+def _run_dir(root, run_date):
+    return os.path.join(root, f'{RUN_PREFIX}{run_date}')
+
+def _normalize_run_date(run_date):
+    if run_date is None:
+        return date.today().isoformat()
+    if isinstance(run_date, (date, datetime)):
+        return run_date.strftime('%Y-%m-%d')
+    return str(run_date)
+
+def _segment_dir_name(segment):
+    # 分群名可能含空格（如 "At Risk"），目录名中仅替换路径分隔符
+    return SEGMENT_PREFIX + str(segment).replace(os.sep, '_')
+
+def _segment_dtype(series):
+    """记录分群列的类型，供读取时还原（分区名与清单键一律是字符串）"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {'dtype': str(dtype.categories.dtype), 'categories': [str(c) for c in dtype.categories]}
+    return {'dtype': str(dtype)}
+
+def _restore_segments(values, info):
+    """把字符串形式的分群值还原为写入时的类型（空值保持为空）"""
+    values = pd.Series(values, dtype=object)
+    dtype = info.get('dtype', 'object')
+    try:
+        kind = np.dtype(dtype).kind
+    except TypeError:
+        # pandas 扩展类型（如 string）按字符串处理
+        kind = 'O'
+
+    def convert(series):
+        if kind in 'iuf':
+            series = pd.to_numeric(series)
+            return series if series.isna().any() else series.astype(dtype)
+        if kind == 'b':
+            return series.map({'True': True, 'False': False})
+        if kind == 'M':
+            return pd.to_datetime(series)
+        return series
+
+    if 'categories' in info:
+        categories = convert(pd.Series(info['categories'], dtype=object))
+        return pd.Categorical(convert(values), categories=categories)
+    return convert(values)
+
+def write_run(df, root='results', run_date=None, segment_column='segment',
+              compression='snappy', overwrite=False):
+    """
+    写入一次运行的结果
+
+    先写入同级临时目录，完成后整体重命名，读者不会看到写了一半的运行。
+    分区名与清单中的分群键为 str(分群)，分群列的原始类型记录在清单的 segment_dtype 中。
+
+    Args:
+        df: 每用户结果表，需包含 segment_column
+        root: 结果根目录
+        run_date: 运行日期，默认今天
+        segment_column: 分群列
+        compression: Parquet 压缩算法
+        overwrite: 同一日期已存在时是否覆盖
+
+    Returns:
+        dict: 该次运行的清单
+    """
+    run_date = _normalize_run_date(run_date)
+    target = _run_dir(root, run_date)
+    if os.path.exists(target) and not overwrite:
+        raise FileExistsError(f"运行结果已存在: {target}")
+    os.makedirs(root, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-run-', dir=root)
+    try:
+        value_columns = [c for c in df.columns if c != segment_column]
+        segments = {}
+        schema = None
+        for segment, part in df.groupby(segment_column, sort=True, observed=True, dropna=False):
+            if pd.isna(segment):
+                segment = NULL_SEGMENT
+            table = pa.Table.from_pandas(part[value_columns], preserve_index=False)
+            schema = schema or table.schema
+            seg_dir = os.path.join(tmp_dir, _segment_dir_name(segment))
+            os.makedirs(seg_dir)
+            pq.write_table(table, os.path.join(seg_dir, 'part-0.parquet'), compression=compression)
+            segments[str(segment)] = {'path': _segment_dir_name(segment), 'rows': len(part)}
+
+        manifest = {
+            'schema_version': SCHEMA_VERSION,
+            'run_date': run_date,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': int(sum(s['rows'] for s in segments.values())),
+            'segment_column': segment_column,
+            'segment_dtype': _segment_dtype(df[segment_column]),
+            'columns': {f.name: str(f.type) for f in schema} if schema else {},
+            'segments': segments,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.rename(tmp_dir, target)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return manifest
+
+def read_manifest(root, run_date):
+    """读取某次运行的清单"""
+    with open(os.path.join(_run_dir(root, _normalize_run_date(run_date)), MANIFEST_NAME),
+              encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('schema_version', '').split('.')[0] != SCHEMA_VERSION.split('.')[0]:
+        raise ValueError(f"不兼容的结果版本: {manifest.get('schema_version')}")
+    return manifest
+
+def list_runs(root='results'):
+    """按日期升序列出已完成的运行（以存在清单为准）"""
+    if not os.path.isdir(root):
+        return []
+    runs = []
+    for name in os.listdir(root):
+        if name.startswith(RUN_PREFIX) and os.path.isfile(os.path.join(root, name, MANIFEST_NAME)):
+            runs.append(name[len(RUN_PREFIX):])
+    return sorted(runs)
+
+def load_run(root, run_date=None, segments=None, columns=None):
+    """
+    读取一次运行的结果，可只读取指定分群与列
+
+    Args:
+        root: 结果根目录
+        run_date: 运行日期，默认最近一次
+        segments: 分群或分群列表（按 str() 匹配清单，整数标签可直接传入），None 表示全部；
+            列表中的 None 表示分群为空的行
+        columns: 需要的列，None 表示全部
+
+    Returns:
+        DataFrame，附带分群列（按清单中记录的类型还原）
+    """
+    if run_date is None:
+        runs = list_runs(root)
+        if not runs:
+            raise FileNotFoundError(f"{root} 下没有可用的运行结果")
+        run_date = runs[-1]
+    manifest = read_manifest(root, run_date)
+    run_dir = _run_dir(root, manifest['run_date'])
+    segment_column = manifest['segment_column']
+
+    if segments is None:
+        segments = list(manifest['segments'])
+    elif pd.api.types.is_scalar(segments):
+        segments = [segments]
+    segments = [NULL_SEGMENT if segment is None else str(segment) for segment in segments]
+
+    frames, labels = [], []
+    for segment in segments:
+        info = manifest['segments'].get(segment)
+        if info is None:
+            continue
+        table = pq.read_table(os.path.join(run_dir, info['path']), columns=columns)
+        frames.append(table.to_pandas())
+        labels.append(np.full(table.num_rows, None if segment == NULL_SEGMENT else segment, dtype=object))
+
+    if not frames:
+        names = list(columns or manifest['columns']) + [segment_column]
+        return pd.DataFrame(columns=names)
+    result = pd.concat(frames, ignore_index=True)
+    result[segment_column] = _restore_segments(np.concatenate(labels), manifest.get('segment_dtype', {}))
+    return result
+
+def prune_runs(root='results', keep=7):
+    """只保留最近 keep 次运行，返回被删除的运行日期"""
+    runs = list_runs(root)
+    removed = runs[:-keep] if keep > 0 else runs
+    for run_date in removed:
+        shutil.rmtree(_run_dir(root, run_date))
+    return removed
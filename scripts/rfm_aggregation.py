@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按分区增量的 RFM 与留存聚合
+每个输入分区（如 dt=2025-10-21）只扫描一次，得到按用户的部分聚合：
+最近/最早活跃时间（取最大/最小）、事件数与消费时长（求和）以及去重的 (用户, 日期) 活跃对，
+保存为 npz。后到分区只需聚合该分区，再把所有部分聚合合并即可得到完整的 RFM 表与留存表。
+
+待处理分区默认取环境变量 PIPELINE_PARTITIONS（由流水线的水位线给出，见 watermark.py），
+外加尚无部分聚合或内容（指纹）已变化的分区；已删除分区的部分聚合会被清理。
+各分区的指纹与最大事件时间记录在状态目录的 _manifest.json 中；
+设置了 PIPELINE_REPORT 时，把所有分区的最大事件时间写入该文件，由流水线记入水位线。
+
+    python scripts/rfm_aggregation.py --input-root data/events --state-dir state/rfm_partials \\
+        --reference-date 2025-10-22 --output results/rfm_table.csv --retention-output results/retention.csv
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from npz_io import save_npz_atomic
+
+PARTITIONS_ENV = 'PIPELINE_PARTITIONS'
+REPORT_ENV = 'PIPELINE_REPORT'
+MANIFEST_NAME = '_manifest.json'
+SECONDS_PER_DAY = 86400
+
+def _partition_files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(f for f in glob.glob(os.path.join(path, '**', '*'), recursive=True)
+                  if os.path.isfile(f) and not os.path.basename(f).startswith(('.', '_')))
+
+def _fingerprint(path):
+    """分区的指纹：总大小、最新修改时间、文件数（与 watermark.fingerprint 一致）"""
+    stats = [os.stat(file) for file in _partition_files(path)]
+    return {'size': sum(stat.st_size for stat in stats),
+            'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0), 'files': len(stats)}
+
+def _read_chunks(path, columns, chunksize):
+    if path.endswith('.parquet'):
+        yield pd.read_parquet(path, columns=columns)
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+def aggregate_partition(path, user_column='user_id', time_column='event_time',
+                        monetary_column='watch_duration', chunksize=500000):
+    """
+    扫描一个分区（文件或目录），返回按用户的部分聚合
+
+    Returns:
+        dict: user_ids, last_seen, first_seen（秒级 Unix 时间, int64）、frequency（int64）、
+              monetary（float64）、active_users（user_ids 下标, int32）、active_days（距纪元天数, int32）
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"分区不存在: {path}")
+    columns = [user_column, time_column, monetary_column]
+    parts = []
+    for file in _partition_files(path):
+        for chunk in _read_chunks(file, columns, chunksize):
+            seconds = pd.to_datetime(chunk[time_column], errors='coerce')
+            chunk = pd.DataFrame({
+                'user': chunk[user_column].to_numpy(),
+                'seconds': seconds.to_numpy('datetime64[s]').astype(np.int64),
+                'monetary': pd.to_numeric(chunk[monetary_column], errors='coerce').fillna(0).to_numpy(),
+            })[seconds.notna().to_numpy() & chunk[user_column].notna().to_numpy()]
+            chunk['day'] = chunk['seconds'] // SECONDS_PER_DAY
+            # 每块先聚合，只保留按用户与按 (用户, 日期) 的小表
+            parts.append(chunk.groupby(['user', 'day'], sort=False).agg(
+                last_seen=('seconds', 'max'), first_seen=('seconds', 'min'),
+                frequency=('seconds', 'size'), monetary=('monetary', 'sum')))
+
+    if not parts:
+        daily = pd.DataFrame(columns=['last_seen', 'first_seen', 'frequency', 'monetary'],
+                             index=pd.MultiIndex.from_arrays([[], []], names=['user', 'day']))
+    else:
+        daily = pd.concat(parts).groupby(level=['user', 'day'], sort=False).agg(
+            {'last_seen': 'max', 'first_seen': 'min', 'frequency': 'sum', 'monetary': 'sum'})
+    users = daily.groupby(level='user', sort=False).agg(
+        {'last_seen': 'max', 'first_seen': 'min', 'frequency': 'sum', 'monetary': 'sum'})
+
+    return {
+        'user_ids': users.index.to_numpy(),
+        'last_seen': users['last_seen'].to_numpy(np.int64),
+        'first_seen': users['first_seen'].to_numpy(np.int64),
+        'frequency': users['frequency'].to_numpy(np.int64),
+        'monetary': users['monetary'].to_numpy(np.float64),
+        'active_users': users.index.get_indexer(daily.index.get_level_values('user')).astype(np.int32),
+        'active_days': daily.index.get_level_values('day').to_numpy(np.int32),
+    }
+
+def save_partial(path, partial):
+    """保存部分聚合（字符串 ID 转为定长字符串，不依赖 pickle），先写临时文件再原子替换"""
+    save_npz_atomic(path, **partial)
+
+def max_event_time(partial):
+    """部分聚合中的最大事件时间（ISO 字符串，无事件时为 None）"""
+    if not len(partial['last_seen']):
+        return None
+    return pd.Timestamp(int(partial['last_seen'].max()), unit='s').isoformat()
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_partial(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+def merge_partials(partials):
+    """
+    合并部分聚合：最近活跃取最大、最早活跃取最小、次数与时长求和
+
+    Returns:
+        DataFrame（索引为用户 ID）: last_seen, first_seen, frequency, monetary
+    """
+    frames = [pd.DataFrame({key: partial[key] for key in ('last_seen', 'first_seen', 'frequency', 'monetary')},
+                           index=partial['user_ids'])
+              for partial in partials if len(partial['user_ids'])]
+    if not frames:
+        return pd.DataFrame(columns=['last_seen', 'first_seen', 'frequency', 'monetary'])
+    return pd.concat(frames).groupby(level=0, sort=False).agg(
+        {'last_seen': 'max', 'first_seen': 'min', 'frequency': 'sum', 'monetary': 'sum'})
+
+def rfm_table(merged, reference_date):
+    """由合并结果计算 RFM 表（recency 为距参考日期的天数）"""
+    reference = pd.Timestamp(reference_date).value // 10 ** 9
+    return pd.DataFrame({
+        'user_id': merged.index.to_numpy(),
+        'recency': (reference - merged['last_seen'].to_numpy(np.int64)) / SECONDS_PER_DAY,
+        'frequency': merged['frequency'].to_numpy(np.int64),
+        'monetary': merged['monetary'].to_numpy(np.float64),
+    })
+
+def retention_table(partials, merged, max_days=30):
+    """
+    按首次活跃日期分组的留存人数
+
+    Returns:
+        DataFrame: 行为首次活跃日期，列为距首日天数 0..max_days，值为当天仍活跃的用户数
+    """
+    first_day = merged['first_seen'].to_numpy(np.int64) // SECONDS_PER_DAY
+    pairs = [pd.DataFrame({'row': merged.index.get_indexer(partial['user_ids'])[partial['active_users']],
+                           'day': partial['active_days']})
+             for partial in partials if len(partial['user_ids'])]
+    if not pairs:
+        return pd.DataFrame()
+    # 迟到事件可能让同一 (用户, 日期) 出现在多个分区中，先去重
+    pairs = pd.concat(pairs, ignore_index=True).drop_duplicates()
+    cohort = first_day[pairs['row'].to_numpy()]
+    offset = pairs['day'].to_numpy(np.int64) - cohort
+    keep = (offset >= 0) & (offset <= max_days)
+    counts = pd.crosstab(cohort[keep], offset[keep])
+    counts.index = pd.to_datetime(counts.index, unit='D').strftime('%Y-%m-%d')
+    counts.index.name = 'cohort'
+    counts.columns.name = 'day'
+    return counts
+
+def update_partials(input_root, state_dir, partitions=None, **kwargs):
+    """
+    重新聚合指定分区、尚无部分聚合的分区以及指纹与清单记录不同的分区，并清理已删除分区的部分聚合
+
+    Args:
+        partitions: 需要重新聚合的分区名；None 时取环境变量 PIPELINE_PARTITIONS
+
+    Returns:
+        partials: 所有分区的部分聚合列表
+        manifest: {分区名: {'fingerprint': 指纹, 'max_event_time': 最大事件时间}}
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    current = sorted(name for name in os.listdir(input_root) if not name.startswith(('.', '_')))
+    if partitions is None:
+        partitions = [p for p in os.environ.get(PARTITIONS_ENV, '').split(',') if p]
+
+    for file in os.listdir(state_dir):
+        if file.endswith('.npz') and file[:-len('.npz')] not in current:
+            os.remove(os.path.join(state_dir, file))
+
+    manifest_path = os.path.join(state_dir, MANIFEST_NAME)
+    recorded = _read_json(manifest_path)
+    manifest, partials = {}, []
+    for name in current:
+        partition_path = os.path.join(input_root, name)
+        partial_path = os.path.join(state_dir, name + '.npz')
+        fingerprint = _fingerprint(partition_path)
+        entry = recorded.get(name)
+        stale = entry is None or entry.get('fingerprint') != fingerprint
+        if name in partitions or stale or not os.path.exists(partial_path):
+            print(f"聚合分区: {name}")
+            partial = aggregate_partition(partition_path, **kwargs)
+            save_partial(partial_path, partial)
+            entry = {'fingerprint': fingerprint, 'max_event_time': max_event_time(partial)}
+        manifest[name] = entry
+        partials.append(load_partial(partial_path))
+    _write_json(manifest_path, manifest)
+    return partials, manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='按分区增量的 RFM 与留存聚合')
+    parser.add_argument('--input-root', required=True, help='按分区存放的行为日志根目录')
+    parser.add_argument('--state-dir', required=True, help='部分聚合的存放目录')
+    parser.add_argument('--partitions', nargs='*', help=f'需要重新聚合的分区，默认取 {PARTITIONS_ENV}')
+    parser.add_argument('--reference-date', required=True, help='recency 参考日期 YYYY-MM-DD')
+    parser.add_argument('--monetary-column', default='watch_duration')
+    parser.add_argument('--output', required=True, help='RFM 表 CSV')
+    parser.add_argument('--retention-output', help='留存表 CSV')
+    args = parser.parse_args()
+
+    partials, manifest = update_partials(args.input_root, args.state_dir, args.partitions,
+                                         monetary_column=args.monetary_column)
+    report = os.environ.get(REPORT_ENV)
+    if report:
+        times = [entry['max_event_time'] for entry in manifest.values() if entry['max_event_time']]
+        _write_json(report, {'max_event_time': max(times) if times else None})
+    merged = merge_partials(partials)
+    rfm_table(merged, args.reference_date).to_csv(args.output, index=False)
+    print(f"✅ RFM 表已保存: {args.output}（{len(merged)} 个用户，{len(partials)} 个分区）")
+    if args.retention_output:
+        retention_table(partials, merged).to_csv(args.retention_output)
+        print(f"✅ 留存表已保存: {args.retention_output}")
+
+if __name__ == "__main__":
+    main()
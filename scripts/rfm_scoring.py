@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置驱动的 RFM 打分与分群映射引擎
+把 config/rfm_config.yaml 中的打分与分群规则一次性编译为：
+- 每个指标的阈值数组（quantile 模式下由数据拟合，custom 模式直接取配置）
+- 所有 R/F/M 分数组合（5 档时为 125 种）到分群的查找表
+
+打分时只需 np.searchsorted 与一次查表，不再逐行匹配规则。
+阈值区间为左开右闭：等于阈值的值落入较低一档。
+"""
+
+import argparse
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+METRICS = ('recency', 'frequency', 'monetary')
+DEFAULT_QUANTILES = [0.2, 0.4, 0.6, 0.8]
+DEFAULT_WEIGHTS = {'r': 0.4, 'f': 0.3, 'm': 0.3}
+
+_OPERATORS = {
+    '>=': operator.ge, '<=': operator.le, '==': operator.eq,
+    '!=': operator.ne, '>': operator.gt, '<': operator.lt,
+}
+_RULE_PATTERN = re.compile(r'^\s*(>=|<=|==|!=|>|<)?\s*(\d+)\s*$')
+
+def load_config(path):
+    """读取 YAML 配置（需要 pyyaml）"""
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("读取 YAML 配置需要 pyyaml: pip install pyyaml")
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def _rule_mask(condition, scores):
+    """把单个条件（">=4"、3 或 [2, 4] 闭区间）应用到分数网格上"""
+    if isinstance(condition, (list, tuple)):
+        low, high = condition
+        return (scores >= low) & (scores <= high)
+    match = _RULE_PATTERN.match(str(condition))
+    if not match:
+        raise ValueError(f"无法解析的分群条件: {condition!r}")
+    op, value = match.groups()
+    return _OPERATORS[op or '=='](scores, int(value))
+
+def compile_segment_table(rules, levels, default='Others'):
+    """
+    把分群规则编译为查找表
+
+    Args:
+        rules: [{'name': 'Champions', 'r': '>=4', 'f': '>=4', 'm': '>=4'}, ...]，按顺序匹配
+        levels: 每个指标的分数档数
+        default: 未命中任何规则时的分群名
+
+    Returns:
+        names: 分群名列表（default 在最后）
+        table: 长度 levels**3 的 int8 数组，下标为 (r-1)*levels² + (f-1)*levels + (m-1)
+    """
+    r, f, m = (grid.ravel() + 1 for grid in np.indices((levels, levels, levels)))
+    grids = {'r': r, 'f': f, 'm': m}
+
+    names = []
+    table = np.full(levels ** 3, -1, dtype=np.int8)
+    for rule in rules:
+        mask = np.ones(levels ** 3, dtype=bool)
+        for key in ('r', 'f', 'm'):
+            if key in rule:
+                mask &= _rule_mask(rule[key], grids[key])
+        if rule['name'] not in names:
+            names.append(rule['name'])
+        # 先命中者优先：只填尚未分配的组合
+        table[mask & (table < 0)] = names.index(rule['name'])
+
+    if default not in names:
+        names.append(default)
+    table[table < 0] = names.index(default)
+    return names, table
+
+class RFMScorer:
+    """编译后的 RFM 打分器"""
+
+    def __init__(self, method='quantile', quantiles=None, thresholds=None, weights=None,
+                 rules=None, default_segment='Others', sample_size=None, seed=42):
+        if method not in ('quantile', 'custom'):
+            raise ValueError(f"未知的打分方法: {method}")
+        self.method = method
+        self.quantiles = np.asarray(quantiles or DEFAULT_QUANTILES, dtype=np.float64)
+        self.sample_size = sample_size
+        self.seed = seed
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.weights = np.array([weights['r'], weights['f'], weights['m']], dtype=np.float32)
+
+        if method == 'custom':
+            if thresholds is None:
+                raise ValueError("custom 模式需要 custom_thresholds")
+            self.thresholds = {metric: np.asarray(thresholds[metric], dtype=np.float64) for metric in METRICS}
+            for metric, values in self.thresholds.items():
+                if np.any(np.diff(values) <= 0):
+                    raise ValueError(f"{metric} 的阈值必须严格递增: {values.tolist()}")
+            lengths = {len(t) for t in self.thresholds.values()}
+            if len(lengths) != 1:
+                raise ValueError("各指标的阈值个数必须一致")
+            self.levels = lengths.pop() + 1
+        else:
+            self.thresholds = None
+            self.levels = len(self.quantiles) + 1
+
+        self.segment_names, self.segment_table = compile_segment_table(
+            rules or [], self.levels, default_segment)
+
+    @classmethod
+    def from_config(cls, config):
+        """由配置字典（YAML 中的 scoring 与 segments 部分）构建"""
+        scoring = config.get('scoring', {})
+        segments = config.get('segments', {})
+        return cls(method=scoring.get('method', 'quantile'),
+                   quantiles=scoring.get('quantiles'),
+                   thresholds=scoring.get('custom_thresholds'),
+                   weights=scoring.get('weights'),
+                   rules=segments.get('rules'),
+                   default_segment=segments.get('default', 'Others'),
+                   sample_size=scoring.get('sample_size'))
+
+    @classmethod
+    def from_yaml(cls, path):
+        return cls.from_config(load_config(path))
+
+    def fit(self, recency, frequency, monetary):
+        """
+        quantile 模式下由数据估计分位点阈值（可抽样）；custom 模式不做任何事
+
+        大量并列值（如 monetary 为 0、frequency 为 1）会产生重复的分位点。
+        重复阈值去重后区间数减少，打分时各区间均匀映射到 1~levels（见 bucket_scores），
+        并列值统一落入最低档。
+        """
+        if self.method != 'quantile':
+            return self
+        rng = np.random.default_rng(self.seed)
+        self.thresholds = {}
+        for metric, values in zip(METRICS, (recency, frequency, monetary)):
+            values = np.asarray(values)
+            if self.sample_size and len(values) > self.sample_size:
+                values = values[rng.integers(0, len(values), self.sample_size)]
+            self.thresholds[metric] = np.unique(np.quantile(values, self.quantiles))
+        return self
+
+    def bucket_scores(self, metric):
+        """
+        区间下标到分数的映射
+
+        阈值未去重时为 1~levels 逐一对应；去重后区间较少，最低区间仍为 1、最高区间仍为 levels，
+        中间区间按比例取整，保证分群规则所用的分数尺度不随数据变化。
+        """
+        n = len(self.thresholds[metric])
+        if n == 0:
+            return np.ones(1, dtype=np.int8)
+        return (1 + np.rint(np.arange(n + 1) * (self.levels - 1) / n)).astype(np.int8)
+
+    def score(self, recency, frequency, monetary):
+        """
+        向量化打分
+
+        Returns:
+            dict: r_score/f_score/m_score（int8, 1~levels）、rfm_score（加权分, float32）、
+                  rfm_code（如 543, int16）、segment（分群编码, int8，对应 segment_names）
+
+        Examples:
+            >>> scorer = RFMScorer().fit([1, 5, 10, 30, 60], [1, 1, 1, 2, 8], [0, 0, 0, 0, 12.5])
+            >>> result = scorer.score([1, 60], [1, 8], [0, 12.5])
+            >>> result['m_score'].tolist(), result['f_score'].tolist(), result['r_score'].tolist()
+            ([1, 5], [1, 5], [5, 1])
+        """
+        if self.thresholds is None:
+            raise RuntimeError("quantile 模式需先调用 fit")
+        levels = self.levels
+        scores = {}
+        for metric, values in zip(METRICS, (recency, frequency, monetary)):
+            # side='left'：等于阈值的值（含并列值）落入较低一档
+            bucket = np.searchsorted(self.thresholds[metric], np.asarray(values), side='left')
+            scores[metric] = self.bucket_scores(metric)[bucket]
+        # recency 越小越好，分数反向
+        r = (levels + 1 - scores['recency']).astype(np.int8)
+        f, m = scores['frequency'], scores['monetary']
+
+        rfm_score = (self.weights[0] * r + self.weights[1] * f + self.weights[2] * m).astype(np.float32)
+        index = (r.astype(np.int32) - 1) * levels * levels + (f - 1) * levels + (m - 1)
+        return {
+            'r_score': r,
+            'f_score': f,
+            'm_score': m,
+            'rfm_score': rfm_score,
+            'rfm_code': r.astype(np.int16) * 100 + f.astype(np.int16) * 10 + m,
+            'segment': self.segment_table[index],
+        }
+
+    def score_frame(self, df, recency='recency', frequency='frequency', monetary='monetary'):
+        """对 RFM 表打分，返回追加了分数与分群列的新 DataFrame"""
+        result = self.score(df[recency].to_numpy(), df[frequency].to_numpy(), df[monetary].to_numpy())
+        segment = pd.Categorical.from_codes(result.pop('segment'), categories=self.segment_names)
+        return df.assign(**result, segment=segment)
+
+def main():
+    parser = argparse.ArgumentParser(description='RFM 打分与分群')
+    parser.add_argument('--config', default='config/rfm_config.yaml')
+    parser.add_argument('--input', required=True, help='RFM 表 CSV（recency, frequency, monetary）')
+    parser.add_argument('--output', required=True, help='分群结果 CSV')
+    args = parser.parse_args()
+
+    rfm_df = pd.read_csv(args.input)
+    scorer = RFMScorer.from_yaml(args.config)
+    scorer.fit(rfm_df['recency'], rfm_df['frequency'], rfm_df['monetary'])
+    segments = scorer.score_frame(rfm_df)
+    segments.to_csv(args.output, index=False)
+    print(segments['segment'].value_counts().to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+两次运行之间的分群迁移矩阵
+把两次运行的分群标签数组按编码后的用户 ID 做排序合并连接，
+得到 k×k 迁移矩阵（如 "Loyal" → "At Risk" 的人数）以及每种迁移的用户列表。
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from result_store import NULL_SEGMENT, load_run, read_manifest
+
+def encode_user_ids(user_ids):
+    """
+    把用户 ID 编码为 uint64
+
+    整数 ID 直接使用；字符串 ID 使用 pandas 的 64 位哈希，
+    5000 万用户下发生碰撞的概率约为 1e-4 量级。
+    """
+    user_ids = np.asarray(user_ids)
+    if user_ids.dtype.kind in 'iu':
+        return user_ids.astype(np.uint64)
+    return pd.util.hash_array(user_ids.astype(object))
+
+def encode_segments(labels, segments):
+    """按给定分群顺序把分群标签（名称或整数标签）转为 int8 编码，不在 segments 中的为 -1"""
+    return pd.Categorical(np.asarray(labels), categories=segments).codes.astype(np.int8)
+
+def migration_matrix(old_ids, old_codes, new_ids, new_codes, n_segments):
+    """
+    计算迁移矩阵
+
+    Args:
+        old_ids, new_ids: 编码后的用户 ID（uint64），同一次运行内不重复
+        old_codes, new_codes: 对应的分群编码（0..n_segments-1）
+        n_segments: 分群数
+
+    Returns:
+        matrix: (n_segments, n_segments) 人数矩阵，行为旧分群、列为新分群
+        old_index, new_index: 两次运行中共同用户（两侧分群均有效）所在的行号
+        transitions: 对应的迁移编码 old * n_segments + new
+        n_common: 两次运行中都出现的用户数（含分群无效的）
+    """
+    # 两侧各排序一次后做有序合并：有序查询的 searchsorted 对缓存友好
+    old_order = np.argsort(old_ids)
+    new_order = np.argsort(new_ids)
+    old_sorted = old_ids[old_order]
+    new_sorted = new_ids[new_order]
+    pos = np.searchsorted(old_sorted, new_sorted)
+    np.minimum(pos, max(len(old_sorted) - 1, 0), out=pos)
+    matched = old_sorted[pos] == new_sorted if len(old_sorted) else np.zeros(len(new_sorted), bool)
+    old_index = old_order[pos[matched]]
+    new_index = new_order[matched]
+
+    old_part = old_codes[old_index]
+    new_part = new_codes[new_index]
+    valid = (old_part >= 0) & (new_part >= 0)
+    old_index, new_index = old_index[valid], new_index[valid]
+    # 迁移编码用 int16 存放，后续稳定排序可走基数排序
+    code_dtype = np.int16 if n_segments * n_segments < np.iinfo(np.int16).max else np.int64
+    transitions = old_part[valid].astype(code_dtype) * n_segments + new_part[valid]
+    matrix = np.bincount(transitions, minlength=n_segments * n_segments).reshape(n_segments, n_segments)
+    return matrix, old_index, new_index, transitions, int(matched.sum())
+
+def transition_users(user_ids, transitions, n_segments, include_unchanged=False):
+    """按迁移编码分组用户，返回 {(旧分群编码, 新分群编码): 用户数组}"""
+    user_ids = np.asarray(user_ids)
+    order = np.argsort(transitions, kind='stable')
+    sorted_codes = transitions[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    groups = {}
+    for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(order)]):
+        if start == stop:
+            continue
+        old, new = divmod(int(sorted_codes[start]), n_segments)
+        if old == new and not include_unchanged:
+            continue
+        groups[(old, new)] = user_ids[order[start:stop]]
+    return groups
+
+def compare_segments(old_user_ids, old_labels, new_user_ids, new_labels, segments=None,
+                     include_unchanged=False, old_keys=None, new_keys=None):
+    """
+    比较两次运行的分群结果
+
+    labels 为分群标签（名称或整数标签），按 segments 顺序编码；
+    old_keys/new_keys 为预先编码好的 uint64 用户键，省去对字符串 ID 的哈希。
+
+    Returns:
+        dict: matrix（DataFrame）、users（{(旧分群, 新分群): 用户 ID 数组}）、
+              new_users（仅出现在新运行的用户数）、lost_users（仅出现在旧运行的用户数）
+    """
+    if segments is None:
+        segments = sorted(set(pd.unique(np.asarray(old_labels))) | set(pd.unique(np.asarray(new_labels))))
+    segments = list(segments)
+    return compare_codes(old_user_ids, encode_segments(old_labels, segments),
+                         new_user_ids, encode_segments(new_labels, segments), segments,
+                         include_unchanged=include_unchanged, old_keys=old_keys, new_keys=new_keys)
+
+def compare_codes(old_user_ids, old_codes, new_user_ids, new_codes, segments,
+                  include_unchanged=False, old_keys=None, new_keys=None):
+    """与 compare_segments 相同，但分群已是按 segments 顺序的 int8 编码（-1 为无效）"""
+    k = len(segments)
+    old_ids = encode_user_ids(old_user_ids) if old_keys is None else np.asarray(old_keys)
+    new_ids = encode_user_ids(new_user_ids) if new_keys is None else np.asarray(new_keys)
+    matrix, _, new_index, transitions, n_common = migration_matrix(
+        old_ids, old_codes, new_ids, new_codes, k)
+
+    # 未提供原始 ID 时，用户列表中返回编码后的键
+    user_ids = new_ids if new_user_ids is None else np.asarray(new_user_ids)
+    groups = transition_users(user_ids[new_index], transitions, k,
+                              include_unchanged=include_unchanged)
+    return {
+        'segments': segments,
+        'matrix': pd.DataFrame(matrix, index=pd.Index(segments, name='from'),
+                               columns=pd.Index(segments, name='to')),
+        'users': {(segments[i], segments[j]): ids for (i, j), ids in groups.items()},
+        'common_users': n_common,
+        'new_users': len(new_ids) - n_common,
+        'lost_users': len(old_ids) - n_common,
+    }
+
+def _load_codes(root, run_date, manifest, segments, columns):
+    """按分群分区读取一次运行，分群编码直接由分区得到，无需解析分群名；分群为空的行编码为 -1"""
+    frames, codes = [], []
+    for segment in manifest['segments']:
+        frame = load_run(root, run_date, segments=segment, columns=columns)
+        frames.append(frame[columns])
+        code = segments.index(segment) if segment in segments else -1
+        codes.append(np.full(len(frame), code, dtype=np.int8))
+    if not frames:
+        return pd.DataFrame(columns=columns), np.empty(0, dtype=np.int8)
+    return pd.concat(frames, ignore_index=True), np.concatenate(codes)
+
+def compare_runs(root, old_run, new_run, user_column='user_id', key_column='user_key',
+                 include_unchanged=False):
+    """
+    比较结果存储中的两次运行（见 result_store）
+
+    若结果表带有 key_column（写入时用 encode_user_ids 生成的 uint64 键），
+    直接用它做连接；否则在此处对 user_column 编码。
+    """
+    old_manifest = read_manifest(root, old_run)
+    new_manifest = read_manifest(root, new_run)
+    segments = sorted((set(old_manifest['segments']) | set(new_manifest['segments'])) - {NULL_SEGMENT})
+
+    runs = []
+    for run_date, manifest in [(old_run, old_manifest), (new_run, new_manifest)]:
+        columns = [user_column] + ([key_column] if key_column in manifest['columns'] else [])
+        frame, codes = _load_codes(root, run_date, manifest, segments, columns)
+        keys = frame[key_column].to_numpy(dtype=np.uint64) if key_column in frame else None
+        runs.append((frame[user_column].to_numpy(), codes, keys))
+
+    (old_ids, old_codes, old_keys), (new_ids, new_codes, new_keys) = runs
+    return compare_codes(old_ids, old_codes, new_ids, new_codes, segments,
+                         include_unchanged=include_unchanged, old_keys=old_keys, new_keys=new_keys)
+
+def main():
+    parser = argparse.ArgumentParser(description='分群迁移矩阵')
+    parser.add_argument('--root', default='results', help='结果存储根目录')
+    parser.add_argument('--old', required=True, help='旧运行日期')
+    parser.add_argument('--new', required=True, help='新运行日期')
+    parser.add_argument('--export-dir', help='导出每种迁移的用户列表 CSV')
+    args = parser.parse_args()
+
+    result = compare_runs(args.root, args.old, args.new)
+    print(result['matrix'].to_string())
+    print(f"\n共同用户: {result['common_users']}  新增: {result['new_users']}  消失: {result['lost_users']}")
+
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+        for (old, new), ids in result['users'].items():
+            name = f"{old}__to__{new}.csv".replace(' ', '_')
+            pd.DataFrame({'user_id': ids}).to_csv(os.path.join(args.export_dir, name), index=False)
+
+if __name__ == "__main__":
+    main()
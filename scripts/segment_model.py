@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的用户分群模型
+把夜间训练得到的标准化参数与聚类中心保存为带版本号的 npz 文件（不依赖 pickle），
+两次训练之间用最近中心分批为新用户打标签，无需重新聚类。
+
+    python scripts/segment_model.py fit --input results/rfm_table.csv --model models/segments.npz
+    python scripts/segment_model.py assign --model models/segments.npz --input new_users.csv --output labels.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from npz_io import save_npz_atomic
+
+MODEL_VERSION = 1
+DEFAULT_COLUMNS = ['Recency', 'Frequency', 'Monetary']
+DEFAULT_BATCH_SIZE = 65536
+
+class SegmentModel:
+    """
+    标准化参数 + 标准化空间中的聚类中心
+
+    Attributes:
+        columns: 特征列名（顺序即特征矩阵的列顺序）
+        mean, scale: 标准化参数（float64）
+        centers: 标准化空间中的聚类中心，形状 (n_clusters, n_features)，float32
+        names: 各分群名称
+    """
+
+    def __init__(self, columns, mean, scale, centers, names=None, version=MODEL_VERSION):
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centers = np.ascontiguousarray(centers, dtype=np.float32)
+        if self.centers.shape[1] != len(self.columns):
+            raise ValueError("聚类中心维度与特征列数不一致")
+        if len(self.centers) > np.iinfo(np.int8).max:
+            raise ValueError("分群数超过 int8 标签的上限")
+        self.names = list(names) if names is not None else [f'Cluster {i+1}' for i in range(len(self.centers))]
+        self.version = version
+        # 最近中心只需比较 ||c||² - 2·x·c，||x||² 对所有中心相同
+        self._center_norms = np.einsum('ij,ij->i', self.centers, self.centers)
+
+    @property
+    def n_clusters(self):
+        return len(self.centers)
+
+    @classmethod
+    def fit(cls, rfm_df, n_clusters=4, columns=None, names=None, seed=42):
+        """用 user_clustering.cluster_users 训练并构建模型"""
+        from user_clustering import cluster_users
+
+        columns = columns or DEFAULT_COLUMNS
+        _, centers, silhouette, (mean, scale) = cluster_users(
+            rfm_df, n_clusters=n_clusters, seed=seed, columns=columns)
+        model = cls.from_original_centers(columns, mean, scale, centers, names)
+        model.silhouette = silhouette
+        return model
+
+    @classmethod
+    def from_original_centers(cls, columns, mean, scale, centers, names=None):
+        """由原始尺度的聚类中心构建（如 cluster_users 的返回值）"""
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        return cls(columns, mean, scale, (np.asarray(centers, dtype=np.float64) - mean) / scale, names)
+
+    def save(self, path):
+        """保存为未压缩的 npz（加载时可直接读入），先写临时文件再原子替换"""
+        save_npz_atomic(path, version=np.array(self.version), columns=np.array(self.columns, dtype=str),
+                        names=np.array(self.names, dtype=str), mean=self.mean, scale=self.scale,
+                        centers=self.centers)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data['version'])
+            if version > MODEL_VERSION:
+                raise ValueError(f"模型版本 {version} 高于当前支持的版本 {MODEL_VERSION}")
+            return cls(data['columns'].tolist(), data['mean'], data['scale'], data['centers'],
+                       data['names'].tolist(), version)
+
+    def _assign_batch(self, batch, out, distances=None):
+        """batch 为已填好的 float32 矩阵（会被原地标准化）"""
+        batch -= self.mean.astype(np.float32)
+        batch /= self.scale.astype(np.float32)
+        scores = batch @ self.centers.T
+        scores *= -2
+        scores += self._center_norms
+        labels = scores.argmin(axis=1)
+        out[:] = labels
+        if distances is not None:
+            nearest = scores[np.arange(len(labels)), labels] + np.einsum('ij,ij->i', batch, batch)
+            distances[:] = np.sqrt(np.maximum(nearest, 0))
+
+    def assign(self, features, batch_size=DEFAULT_BATCH_SIZE, return_distance=False):
+        """
+        为用户分配最近的聚类中心
+
+        Args:
+            features: DataFrame（按 columns 取列）或 (n, n_features) 数组，原始尺度
+            batch_size: 每批用户数，限制临时矩阵的内存
+            return_distance: 是否同时返回到最近中心的距离（标准化空间）
+
+        Returns:
+            labels: int8 分群标签；return_distance=True 时返回 (labels, distances)
+        """
+        if isinstance(features, pd.DataFrame):
+            columns = [features[column].to_numpy() for column in self.columns]
+        else:
+            features = np.asarray(features)
+            if features.ndim != 2 or features.shape[1] != len(self.columns):
+                raise ValueError(f"特征矩阵应为 (n, {len(self.columns)})")
+            columns = [features[:, j] for j in range(len(self.columns))]
+
+        n = len(columns[0]) if columns else 0
+        labels = np.empty(n, dtype=np.int8)
+        distances = np.empty(n, dtype=np.float32) if return_distance else None
+        batch = np.empty((min(batch_size, n), len(self.columns)), dtype=np.float32)
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            view = batch[:stop - start]
+            for j, values in enumerate(columns):
+                view[:, j] = values[start:stop]
+            self._assign_batch(view, labels[start:stop],
+                               distances[start:stop] if return_distance else None)
+        return (labels, distances) if return_distance else labels
+
+    def assign_frame(self, df, batch_size=DEFAULT_BATCH_SIZE):
+        """返回追加了 Cluster（int8）与 segment（分群名）列的新 DataFrame"""
+        labels = self.assign(df, batch_size)
+        return df.assign(Cluster=labels, segment=pd.Categorical.from_codes(labels, categories=self.names))
+
+def main():
+    parser = argparse.ArgumentParser(description='用户分群模型的训练与批量打标签')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    fit_parser = subparsers.add_parser('fit', help='训练并保存模型')
+    fit_parser.add_argument('--input', required=True, help='用户特征 CSV')
+    fit_parser.add_argument('--model', required=True, help='模型文件路径（.npz）')
+    fit_parser.add_argument('--n-clusters', type=int, default=4)
+    fit_parser.add_argument('--columns', nargs='+', default=DEFAULT_COLUMNS)
+
+    assign_parser = subparsers.add_parser('assign', help='用已保存的模型为用户打标签')
+    assign_parser.add_argument('--model', required=True)
+    assign_parser.add_argument('--input', required=True, help='新用户特征 CSV')
+    assign_parser.add_argument('--output', required=True, help='带分群标签的 CSV')
+    assign_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        model = SegmentModel.fit(pd.read_csv(args.input), n_clusters=args.n_clusters, columns=args.columns)
+        model.save(args.model)
+        print(f"✅ 模型已保存: {args.model}（{model.n_clusters} 个分群，轮廓系数 {model.silhouette:.3f}）")
+    else:
+        model = SegmentModel.load(args.model)
+        df = pd.read_csv(args.input)
+        labeled = model.assign_frame(df, args.batch_size)
+        labeled.to_csv(args.output, index=False)
+        print(labeled['segment'].value_counts().to_string())
+
+if __name__ == "__main__":
+    main()
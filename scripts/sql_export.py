@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户 RFM 分群结果批量导出到关系型数据库
+对应系统架构图存储层中的 MySQL；本地可用 SQLite 验证。
+
+写入流程：
+1. 建立临时表 <table>__staging
+2. 按批次 executemany 写入（pymysql 会改写为多行 INSERT），
+   MySQL 下用连接池中的多个连接并行写入
+3. 在事务中把临时表换成正式表，旧表随后删除，读者不会看到半成品
+"""
+
+import argparse
+import queue
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TABLE = 'user_segments'
+DEFAULT_BATCH_SIZE = 10000
+
+DIALECTS = {
+    'sqlite': {
+        'placeholder': '?',
+        'quote': '"',
+        'types': {'i': 'INTEGER', 'u': 'INTEGER', 'f': 'REAL', 'b': 'INTEGER', 'O': 'TEXT'},
+        'parallel': False,
+    },
+    'mysql': {
+        'placeholder': '%s',
+        'quote': '`',
+        'types': {'i': 'BIGINT', 'u': 'BIGINT', 'f': 'DOUBLE', 'b': 'TINYINT', 'O': 'VARCHAR(255)'},
+        'parallel': True,
+    },
+}
+
+class ConnectionPool:
+    """
+    简单的 DB-API 连接池
+
+    队列中放的是空闲连接或空位（None），空位在借出时才建立连接；
+    出错的连接状态不可信，直接关闭并让出空位，下次借出时重建。
+    """
+
+    def __init__(self, connect, size=4, dialect='sqlite'):
+        if dialect not in DIALECTS:
+            raise ValueError(f"不支持的数据库类型: {dialect}")
+        self.dialect = dialect
+        self.size = size
+        self._connect = connect
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接，用完归还；异常时回滚并关闭该连接，不再放回池中"""
+        conn = self._idle.get()
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._idle.put(None)
+                raise
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            raise
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        """回滚并关闭连接（连接已断开时忽略错误），空出的位置留给新连接"""
+        try:
+            conn.rollback()
+            conn.close()
+        except Exception:
+            pass
+        finally:
+            self._idle.put(None)
+
+    def close(self):
+        """关闭所有空闲连接（池仍可继续使用，之后按需重建）"""
+        slots = 0
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
+            slots += 1
+        for _ in range(slots):
+            self._idle.put(None)
+
+def sqlite_pool(path, size=1):
+    """SQLite 连接池（SQLite 单写者，默认只开一个连接）"""
+    return ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False),
+                          size=size, dialect='sqlite')
+
+def mysql_pool(host, user, password, database, port=3306, size=4):
+    """MySQL 连接池，需要安装 pymysql"""
+    try:
+        import pymysql
+    except ImportError:
+        raise ImportError("导出到 MySQL 需要 pymysql: pip install pymysql")
+    return ConnectionPool(
+        lambda: pymysql.connect(host=host, user=user, password=password, database=database,
+                                port=port, charset='utf8mb4', autocommit=False),
+        size=size, dialect='mysql')
+
+def _quote(name, dialect):
+    q = DIALECTS[dialect]['quote']
+    return q + name.replace(q, q + q) + q
+
+def _column_types(df, dialect):
+    types = DIALECTS[dialect]['types']
+    return [types.get(df[c].dtype.kind, types['O']) for c in df.columns]
+
+def _batch_rows(columns, start, stop):
+    """把各列切片转为 Python 原生值的行元组，NaN 转为 NULL"""
+    values = []
+    for column in columns:
+        part = column[start:stop]
+        if part.dtype.kind == 'f' and np.isnan(part).any():
+            part = np.where(np.isnan(part), None, part.astype(object))
+        values.append(part.tolist())
+    return list(zip(*values))
+
+def _drop_table(cursor, name, dialect):
+    cursor.execute(f"DROP TABLE IF EXISTS {_quote(name, dialect)}")
+
+def _table_exists(cursor, name, dialect):
+    if dialect == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    else:
+        cursor.execute("SHOW TABLES LIKE %s", (name,))
+    return cursor.fetchone() is not None
+
+def _swap_in(pool, table, staging, dialect):
+    """在事务中用临时表替换正式表"""
+    old = f'{table}__old'
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        _drop_table(cursor, old, dialect)
+        exists = _table_exists(cursor, table, dialect)
+        if dialect == 'sqlite':
+            cursor.execute("BEGIN")
+            if exists:
+                cursor.execute(f"ALTER TABLE {_quote(table, dialect)} RENAME TO {_quote(old, dialect)}")
+            cursor.execute(f"ALTER TABLE {_quote(staging, dialect)} RENAME TO {_quote(table, dialect)}")
+            conn.commit()
+        else:
+            # MySQL 的多表 RENAME TABLE 本身是原子的
+            renames = [f"{_quote(staging, dialect)} TO {_quote(table, dialect)}"]
+            if exists:
+                renames.insert(0, f"{_quote(table, dialect)} TO {_quote(old, dialect)}")
+            cursor.execute("RENAME TABLE " + ", ".join(renames))
+            conn.commit()
+        _drop_table(cursor, old, dialect)
+        conn.commit()
+
+def export_segments(df, pool, table=DEFAULT_TABLE, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    把每用户的 RFM 与分群结果表写入数据库
+
+    Args:
+        df: DataFrame，如 user_id, recency, frequency, monetary, r_score ..., segment
+        pool: ConnectionPool
+        table: 目标表名
+        batch_size: 每批写入行数
+
+    Returns:
+        写入行数
+    """
+    dialect = pool.dialect
+    staging = f'{table}__staging'
+    names = [str(c) for c in df.columns]
+    columns = [df[c].to_numpy() for c in df.columns]
+    column_sql = ", ".join(f"{_quote(n, dialect)} {t}"
+                           for n, t in zip(names, _column_types(df, dialect)))
+    placeholders = ", ".join([DIALECTS[dialect]['placeholder']] * len(names))
+    insert_sql = (f"INSERT INTO {_quote(staging, dialect)} "
+                  f"({', '.join(_quote(n, dialect) for n in names)}) VALUES ({placeholders})")
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        _drop_table(cursor, staging, dialect)
+        cursor.execute(f"CREATE TABLE {_quote(staging, dialect)} ({column_sql})")
+        conn.commit()
+
+    def write_batch(start):
+        with pool.connection() as conn:
+            conn.cursor().executemany(insert_sql, _batch_rows(columns, start, start + batch_size))
+            conn.commit()
+
+    starts = range(0, len(df), batch_size)
+    try:
+        if DIALECTS[dialect]['parallel'] and pool.size > 1:
+            with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                list(executor.map(write_batch, starts))
+        else:
+            # 单连接时整表在一个事务内写入
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                for start in starts:
+                    cursor.executemany(insert_sql, _batch_rows(columns, start, start + batch_size))
+                conn.commit()
+    except Exception:
+        with pool.connection() as conn:
+            _drop_table(conn.cursor(), staging, dialect)
+            conn.commit()
+        raise
+
+    _swap_in(pool, table, staging, dialect)
+    return len(df)
+
+def main():
+    parser = argparse.ArgumentParser(description='分群结果导出到数据库')
+    parser.add_argument('--input', required=True, help='分群结果 CSV（如 results/segments.csv）')
+    parser.add_argument('--sqlite', help='SQLite 数据库文件')
+    parser.add_argument('--mysql-host')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-user')
+    parser.add_argument('--mysql-password', default='')
+    parser.add_argument('--mysql-db')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--table', default=DEFAULT_TABLE)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.sqlite:
+        pool = sqlite_pool(args.sqlite)
+    elif args.mysql_host:
+        pool = mysql_pool(args.mysql_host, args.mysql_user, args.mysql_password,
+                          args.mysql_db, port=args.mysql_port, size=args.pool_size)
+    else:
+        parser.error("需要指定 --sqlite 或 --mysql-host")
+
+    df = pd.read_csv(args.input)
+    try:
+        rows = export_segments(df, pool, table=args.table, batch_size=args.batch_size)
+    finally:
+        pool.close()
+    print(f"✅ 已写入 {rows} 行到表 {args.table}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可合并的流式直方图
+分布图只需要各分箱的计数：按块累加到固定分箱（线性或对数间隔），
+内存为 O(分箱数)，与事件数量无关；各分片的直方图按分箱相加即可合并，
+中位数与分位数由分箱内插值近似得到。
+
+- BinnedHistogram：连续值（观看时长等），线性或对数分箱
+- IntegerHistogram：非负整数（观看次数、活跃天数等），每个整数一个分箱
+"""
+
+import numpy as np
+import pandas as pd
+
+class BinnedHistogram:
+    """
+    固定分箱的直方图
+
+    区间为左闭右开，最后一个分箱包含上边界（与 np.histogram 一致）；
+    范围外的值分别计入 underflow / overflow，NaN 计入 missing。
+    """
+
+    def __init__(self, edges, scale='linear'):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or len(self.edges) < 2 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError("分箱边界必须是严格递增的一维数组")
+        self.scale = scale
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.float64)
+        self.underflow = 0.0
+        self.overflow = 0.0
+        self.missing = 0
+        self.total = 0.0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def linear(cls, low, high, bins=50):
+        return cls(np.linspace(low, high, bins + 1), 'linear')
+
+    @classmethod
+    def log(cls, low, high, bins=50):
+        """对数间隔分箱，low 必须为正；< low 的值（含 0 与负数）计入 underflow，等于 low 的值落入第一个分箱"""
+        if low <= 0:
+            raise ValueError("对数分箱的下界必须为正")
+        return cls(np.geomspace(low, high, bins + 1), 'log')
+
+    @property
+    def bins(self):
+        return len(self.counts)
+
+    @property
+    def widths(self):
+        return np.diff(self.edges)
+
+    def add(self, values, weights=None):
+        """累加一块数据"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        self.missing += int(len(values) - finite.sum())
+        values, weights = values[finite], weights[finite]
+        if not len(values):
+            return
+
+        # 下标 0 为 underflow，1..bins 为各分箱，bins+1 为 overflow
+        index = np.searchsorted(self.edges, values, side='right')
+        index[values == self.edges[-1]] = self.bins
+        binned = np.bincount(index, weights=weights, minlength=self.bins + 2)
+        self.underflow += binned[0]
+        self.counts += binned[1:-1]
+        self.overflow += binned[-1]
+
+        self.total += weights.sum()
+        self.sum += np.dot(values, weights)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    def merge(self, other):
+        """合并另一分片（分箱必须相同）"""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("分箱边界不一致，无法合并")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.missing += other.missing
+        self.total += other.total
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.sum / self.total if self.total else np.nan
+
+    def quantile(self, q):
+        """
+        近似分位数：定位累计计数所在的分箱后在箱内插值（对数分箱按几何插值）
+
+        underflow / overflow 部分以观测到的 min / max 为外侧边界。
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if not self.total:
+            return np.full(q.shape, np.nan)
+        edges = np.concatenate([[min(self.min, self.edges[0])], self.edges, [max(self.max, self.edges[-1])]])
+        counts = np.concatenate([[self.underflow], self.counts, [self.overflow]])
+        cumulative = np.cumsum(counts)
+        target = q * self.total
+        index = np.clip(np.searchsorted(cumulative, target, side='left'), 0, len(counts) - 1)
+        before = np.where(index > 0, cumulative[index - 1], 0.0)
+        fraction = np.where(counts[index] > 0, (target - before) / np.maximum(counts[index], 1e-300), 0.0)
+        low, high = edges[index], edges[index + 1]
+        if self.scale == 'log' and np.all(low > 0):
+            result = low * (high / low) ** fraction
+        else:
+            result = low + (high - low) * fraction
+        return np.clip(result, self.min, self.max)
+
+    def median(self):
+        return float(self.quantile(0.5))
+
+    def density(self):
+        """按分箱宽度归一化的概率密度（对数分箱作图时更直观）"""
+        return self.counts / (self.total * self.widths) if self.total else np.zeros(self.bins)
+
+class IntegerHistogram:
+    """非负整数的直方图：counts[k] 为取值 k 的次数，≥ max_value 的合并到最后一个分箱"""
+
+    def __init__(self, max_value=100):
+        self.max_value = int(max_value)
+        self.counts = np.zeros(self.max_value + 1, dtype=np.int64)
+        self.missing = 0
+
+    def add(self, values):
+        values = pd.Series(values)
+        valid = values.dropna().to_numpy()
+        self.missing += int(len(values) - len(valid))
+        valid = np.clip(valid.astype(np.int64), 0, self.max_value)
+        self.counts += np.bincount(valid, minlength=self.max_value + 1)
+
+    def merge(self, other):
+        if self.max_value != other.max_value:
+            raise ValueError("取值上限不一致，无法合并")
+        self.counts += other.counts
+        self.missing += other.missing
+        return self
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def values(self):
+        return np.arange(self.max_value + 1)
+
+    @property
+    def mean(self):
+        return float(np.dot(self.values, self.counts) / self.total) if self.total else np.nan
+
+    def quantile(self, q):
+        """取累计计数首次达到 q·total 的取值"""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.total:
+            return np.full(q.shape, np.nan)
+        return np.searchsorted(np.cumsum(self.counts), q * self.total, side='left').clip(0, self.max_value)
+
+    def median(self):
+        return int(self.quantile(0.5))
+
+    def nonzero(self):
+        """非零分箱的 (取值, 次数)，用于条形图"""
+        index = np.flatnonzero(self.counts)
+        return index, self.counts[index]
+
+def fill_from_csv(path, histograms, chunksize=500000):
+    """
+    按块读取 CSV 并累加到直方图
+
+    Args:
+        histograms: {列名: 直方图}
+    """
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=list(histograms)):
+        for column, histogram in histograms.items():
+            histogram.add(chunk[column].to_numpy())
+    return histograms
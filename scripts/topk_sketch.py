@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 Top-K 内容排行（重度命中草图）
+一次扫描行为日志，按观看次数与观看时长跟踪 Top 内容，
+可按分群、按天分别统计，各分片的结果可直接合并。
+
+- SpaceSaving：容量固定的候选计数器，给出上界估计及误差
+- CountMinSketch：固定内存的频次上界估计，用于收紧 SpaceSaving 的估计
+
+替代 05_top_analysis.hql 的全量 GROUP BY + 排序，用于近实时的“热门视频”。
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# 64 位整数混合常数（splitmix64）
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+def hash_keys(values, seed=0):
+    """把任意键（整数或字符串）哈希为 uint64，不同 seed 得到相互独立的哈希"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        h = values.astype(np.uint64)
+    else:
+        h = pd.util.hash_array(values.astype(object))
+    with np.errstate(over='ignore'):
+        h = h + _GOLDEN * np.uint64(seed + 1)
+        h = (h ^ (h >> np.uint64(30))) * _MIX_1
+        h = (h ^ (h >> np.uint64(27))) * _MIX_2
+        return h ^ (h >> np.uint64(31))
+
+class CountMinSketch:
+    """Count-Min 草图：depth 行 × width 列，估计值只会偏大"""
+
+    def __init__(self, width=1 << 16, depth=4, seed=0):
+        if width & (width - 1):
+            raise ValueError("width 必须是 2 的幂")
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.float64)
+
+    def _columns(self, hashes, row):
+        return (hash_keys(hashes, self.seed * self.depth + row) & np.uint64(self.width - 1)).astype(np.intp)
+
+    def update(self, keys, weights=None):
+        hashes = hash_keys(keys)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(self._columns(hashes, row), weights=weights, minlength=self.width)
+
+    def query(self, keys):
+        hashes = hash_keys(keys)
+        return np.min([self.table[row, self._columns(hashes, row)] for row in range(self.depth)], axis=0)
+
+    def merge(self, other):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Count-Min 草图参数不一致，无法合并")
+        self.table += other.table
+        return self
+
+class SpaceSaving:
+    """
+    可合并的 SpaceSaving 摘要
+
+    counts 为每个候选的上界估计，errors 为估计的最大偏差（真实值 ≥ count - error），
+    floor 为未被跟踪的键可能达到的最大真实值。
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.float64)
+        self.errors = pd.Series(dtype=np.float64)
+        self.floor = 0.0
+
+    def _absorb(self, counts, errors, floor):
+        """与另一份摘要合并，保留估计值最大的 capacity 个键"""
+        union = self.counts.index.union(counts.index)
+        merged = (self.counts.reindex(union, fill_value=self.floor)
+                  + counts.reindex(union, fill_value=floor))
+        merged_errors = (self.errors.reindex(union, fill_value=self.floor)
+                         + errors.reindex(union, fill_value=floor))
+        new_floor = self.floor + floor
+        if len(merged) > self.capacity:
+            merged = merged.nlargest(self.capacity + 1)
+            new_floor = max(new_floor, float(merged.iloc[-1]))
+            merged = merged.iloc[:-1]
+        self.counts = merged
+        self.errors = merged_errors.reindex(merged.index)
+        self.floor = new_floor
+
+    def update(self, keys, weights=None):
+        """用一块数据更新：先精确聚合本块，截断为 capacity 个后再合并"""
+        if weights is None:
+            chunk = pd.Series(keys).value_counts().astype(np.float64)
+        else:
+            chunk = pd.Series(np.asarray(weights, dtype=np.float64)).groupby(np.asarray(keys)).sum()
+        self.update_aggregated(chunk)
+
+    def update_aggregated(self, chunk):
+        """用已聚合的 {键: 权重} Series 更新"""
+        floor = 0.0
+        if len(chunk) > self.capacity:
+            chunk = chunk.nlargest(self.capacity + 1)
+            floor = float(chunk.iloc[-1])
+            chunk = chunk.iloc[:-1]
+        self._absorb(chunk, pd.Series(0.0, index=chunk.index), floor)
+
+    def merge(self, other):
+        self._absorb(other.counts, other.errors, other.floor)
+        return self
+
+    def top(self, k=10):
+        """返回估计值最大的 k 个键：key, count, error"""
+        top = self.counts.nlargest(k)
+        return pd.DataFrame({'key': top.index, 'count': top.values,
+                             'error': self.errors.reindex(top.index).values})
+
+class TopKTracker:
+    """
+    按 (分群, 日期) 分组的 Top-K 内容跟踪器
+
+    每组对观看次数（views）与观看时长（watch_time）各维护一个 SpaceSaving；
+    全局另有两个 Count-Min 草图，用于收紧各组全局汇总时的估计。
+    """
+
+    METRICS = ('views', 'watch_time')
+
+    def __init__(self, capacity=1000, by_segment=False, by_day=False, cms_width=1 << 16, cms_depth=4):
+        self.capacity = capacity
+        self.by_segment = by_segment
+        self.by_day = by_day
+        self.groups = {}
+        self.cms = {metric: CountMinSketch(cms_width, cms_depth) for metric in self.METRICS}
+
+    def _group(self, key):
+        if key not in self.groups:
+            self.groups[key] = {metric: SpaceSaving(self.capacity) for metric in self.METRICS}
+        return self.groups[key]
+
+    def update(self, events, content_column='content_id', segment_column='segment',
+               time_column='event_time', duration_column='watch_duration'):
+        """用一块事件 DataFrame 更新"""
+        group_columns = []
+        duration = np.nan_to_num(events[duration_column].to_numpy(dtype=np.float64))
+        frame = pd.DataFrame({'content': events[content_column].to_numpy(), 'duration': duration})
+        if self.by_segment:
+            frame['segment'] = events[segment_column].to_numpy()
+            group_columns.append('segment')
+        if self.by_day:
+            frame['day'] = pd.to_datetime(events[time_column]).dt.strftime('%Y-%m-%d').to_numpy()
+            group_columns.append('day')
+
+        self.cms['views'].update(frame['content'])
+        self.cms['watch_time'].update(frame['content'], frame['duration'].to_numpy())
+
+        # 每块只做一次分组聚合，再按组喂给各自的摘要
+        aggregated = frame.groupby(group_columns + ['content'], sort=False)['duration'].agg(['size', 'sum'])
+        if not group_columns:
+            self._feed(('all',), aggregated)
+            return
+        for key, part in aggregated.groupby(level=list(range(len(group_columns))), sort=False):
+            key = key if isinstance(key, tuple) else (key,)
+            self._feed(key, part.droplevel(list(range(len(group_columns)))))
+
+    def _feed(self, key, aggregated):
+        group = self._group(key)
+        group['views'].update_aggregated(aggregated['size'].astype(np.float64))
+        group['watch_time'].update_aggregated(aggregated['sum'])
+
+    def merge(self, other):
+        """合并另一分片的跟踪器"""
+        if (self.by_segment, self.by_day) != (other.by_segment, other.by_day):
+            raise ValueError("分组方式不一致，无法合并")
+        for key, sketches in other.groups.items():
+            group = self._group(key)
+            for metric in self.METRICS:
+                group[metric].merge(sketches[metric])
+        for metric in self.METRICS:
+            self.cms[metric].merge(other.cms[metric])
+        return self
+
+    def top(self, k=10, metric='views', key=None):
+        """
+        返回 Top-K 内容
+
+        Args:
+            k: 返回条数
+            metric: 'views' 或 'watch_time'
+            key: 分组键，如 ('Loyal', '2025-10-22')；None 表示合并所有分组
+        """
+        if key is not None:
+            return self.groups[key][metric].top(k)
+        summary = SpaceSaving(self.capacity)
+        for sketches in self.groups.values():
+            summary.merge(sketches[metric])
+        top = summary.top(k)
+        if len(top):
+            # 两种上界取较小者
+            top['count'] = np.minimum(top['count'], self.cms[metric].query(top['key'].to_numpy()))
+            top = top.sort_values('count', ascending=False, ignore_index=True)
+        return top
+
+def main():
+    parser = argparse.ArgumentParser(description='流式 Top-K 内容排行')
+    parser.add_argument('--input', required=True, help='行为日志 CSV')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--capacity', type=int, default=1000)
+    parser.add_argument('--by-day', action='store_true')
+    parser.add_argument('--chunksize', type=int, default=500000)
+    args = parser.parse_args()
+
+    tracker = TopKTracker(capacity=args.capacity, by_day=args.by_day)
+    for chunk in pd.read_csv(args.input, chunksize=args.chunksize):
+        tracker.update(chunk)
+
+    for metric in TopKTracker.METRICS:
+        print(f"\n=== Top {args.k} by {metric} ===")
+        print(tracker.top(args.k, metric).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
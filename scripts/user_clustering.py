@@ -19,13 +19,31 @@ def setup_english_fonts():
     plt.rcParams['font.family'] = 'DejaVu Sans'
     plt.rcParams['font.size'] = 10
 
-def generate_kmeans_clustering():
-    """生成K-means聚类结果散点图"""
-    setup_english_fonts()
-    
-    # 生成RFM数据
-    np.random.seed(42)
-    n_users = 800
+RFM_COLUMNS = ['Recency', 'Frequency', 'Monetary']
+
+# 紧凑模式下各列的存储类型：RFM 用 float32，计数用 int16/int32，标签用 int8
+COMPACT_DTYPES = {
+    'Recency': np.float32,
+    'Frequency': np.float32,
+    'Monetary': np.float32,
+    'ActiveDays': np.int16,
+    'Tenure': np.int32,
+    'True_Cluster': np.int8,
+    'Cluster': np.int8,
+}
+
+# 分群画像维度及其对应的用户特征列（Recency越小越好，需反向）
+PROFILE_FEATURES = [
+    ('R', 'Recency', True),
+    ('F', 'Frequency', False),
+    ('M', 'Monetary', False),
+    ('Activity', 'ActiveDays', False),
+    ('Loyalty', 'Tenure', False),
+]
+
+def generate_user_features(n_users=800, seed=42, compact=True):
+    """生成模拟用户特征表（RFM + 活跃天数 + 注册时长）"""
+    np.random.seed(seed)
     
     # 创建4个不同的用户群体
     cluster_centers = np.array([
@@ -34,6 +52,13 @@ def generate_kmeans_clustering():
         [8, 4, 120],   # 普通用户
         [2, 10, 300]   # 忠诚用户
     ])
+    # 各群体的月活跃天数与注册时长（天）
+    behavior_centers = np.array([
+        [22, 400],
+        [5, 90],
+        [12, 200],
+        [26, 700]
+    ])
     
     # 为每个集群生成数据
     data = []
@@ -47,17 +72,159 @@ def generate_kmeans_clustering():
     all_data = np.vstack(data)
     rfm_df = pd.DataFrame(all_data, columns=['Recency', 'Frequency', 'Monetary', 'True_Cluster'])
     
-    # 标准化数据
-    scaler = StandardScaler()
-    rfm_scaled = scaler.fit_transform(rfm_df[['Recency', 'Frequency', 'Monetary']])
+    # 追加行为特征（在RFM之后生成，不影响RFM的随机序列）
+    true_clusters = rfm_df['True_Cluster'].to_numpy().astype(int)
+    behavior = np.random.normal(behavior_centers[true_clusters], [3, 60])
+    behavior = np.clip(behavior, [0, 0], [31, 1500])
+    rfm_df['ActiveDays'] = behavior[:, 0]
+    rfm_df['Tenure'] = behavior[:, 1]
+    
+    if compact:
+        rfm_df = compact_user_features(rfm_df)
+    return rfm_df, cluster_centers
+
+def compact_user_features(df):
+    """把用户特征表转为紧凑类型（计数列四舍五入为整数）"""
+    columns = {}
+    for column, dtype in COMPACT_DTYPES.items():
+        if column not in df.columns:
+            continue
+        values = df[column].to_numpy()
+        if np.issubdtype(dtype, np.integer) and values.dtype.kind == 'f':
+            values = np.rint(values)
+        columns[column] = values.astype(dtype, copy=False)
+    return df.assign(**columns)
+
+def feature_matrix(df, columns=None):
+    """按列填充一个 C 连续的 float32 特征矩阵（唯一一次拷贝）"""
+    columns = columns or RFM_COLUMNS
+    matrix = np.empty((len(df), len(columns)), dtype=np.float32)
+    for j, column in enumerate(columns):
+        matrix[:, j] = df[column].to_numpy()
+    return matrix
+
+def scale_inplace(matrix, block_size=65536):
+    """
+    原地标准化（等价于 StandardScaler，但不产生 float64 副本）
+    
+    均值与标准差按行块以 float64 累加（两遍：先求和再求离差平方和），
+    临时数组只有 block_size 行，不随用户数增长。
+    
+    Returns:
+        mean, scale: 用于反变换或对新用户做同样的变换
+    """
+    n_rows = max(len(matrix), 1)
+    total = np.zeros(matrix.shape[1], dtype=np.float64)
+    for start in range(0, len(matrix), block_size):
+        total += matrix[start:start + block_size].sum(axis=0, dtype=np.float64)
+    mean = total / n_rows
+    squares = np.zeros(matrix.shape[1], dtype=np.float64)
+    for start in range(0, len(matrix), block_size):
+        centered = matrix[start:start + block_size] - mean
+        squares += np.einsum('ij,ij->j', centered, centered)
+    scale = np.sqrt(squares / n_rows)
+    scale[scale == 0] = 1.0
+    matrix -= mean.astype(matrix.dtype)
+    matrix /= scale.astype(matrix.dtype)
+    return mean, scale
+
+def cluster_users(rfm_df, n_clusters=4, compact=True, silhouette_sample=10000, seed=42, columns=None):
+    """
+    对用户 RFM 特征做标准化与 K-means 聚类
+    
+    compact=True 时特征矩阵为 float32 并原地标准化，KMeans 保持 float32 计算，
+    标签为 int8；compact=False 时沿用 StandardScaler 的 float64 流程。
+    columns 为参与聚类的特征列，默认 RFM_COLUMNS。
+    
+    Returns:
+        labels: 每个用户的分群标签
+        centers: 原始尺度下的聚类中心
+        silhouette: 轮廓系数（大样本时抽样计算）
+        (mean, scale): 标准化参数
+    """
+    if compact:
+        rfm_scaled = feature_matrix(rfm_df, columns)
+        mean, scale = scale_inplace(rfm_scaled)
+    else:
+        scaler = StandardScaler()
+        rfm_scaled = scaler.fit_transform(rfm_df[columns or RFM_COLUMNS])
+        mean, scale = scaler.mean_, scaler.scale_
     
-    # 应用K-means聚类
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-    clusters = kmeans.fit_predict(rfm_scaled)
+    kmeans = KMeans(n_clusters=n_clusters, random_state=seed, n_init=10)
+    labels = kmeans.fit_predict(rfm_scaled)
+    if compact:
+        labels = labels.astype(np.int8)
+    
+    sample_size = silhouette_sample if len(rfm_scaled) > silhouette_sample else None
+    silhouette_avg = silhouette_score(rfm_scaled, labels, sample_size=sample_size, random_state=seed)
+    centers = kmeans.cluster_centers_.astype(np.float64) * scale + mean
+    return labels, centers, silhouette_avg, (mean, scale)
+
+def compute_cluster_profiles(features, labels, n_clusters=None, invert=None):
+    """
+    计算各分群的归一化特征画像
+    
+    每个特征先按全体用户做百分位归一化（0~1），再用一次 bincount
+    按分群标签求均值，避免对每个特征做 groupby。
+    
+    Args:
+        features: (n_users, n_features) 特征矩阵
+        labels: (n_users,) 分群标签，取值 0..n_clusters-1
+        n_clusters: 分群数，默认 labels.max() + 1
+        invert: 长度为 n_features 的布尔序列，True 表示数值越小越好
+    
+    Returns:
+        profiles: (n_clusters, n_features) 各分群的平均百分位
+        sizes: (n_clusters,) 各分群用户数
+    """
+    features = np.asarray(features)
+    labels = np.asarray(labels, dtype=np.intp)
+    n_users, n_features = features.shape
+    if n_clusters is None:
+        n_clusters = int(labels.max()) + 1 if n_users else 0
+    
+    # 百分位归一化：按列的平均秩 / (n - 1)，并列值取相同的平均秩，结果与行顺序无关；
+    # 逐列排序，只保留一列的排序副本
+    ranks = np.empty(features.shape, dtype=np.float32)
+    for j in range(n_features):
+        column = features[:, j]
+        ordered = np.sort(column)
+        ranks[:, j] = (np.searchsorted(ordered, column, 'left')
+                       + np.searchsorted(ordered, column, 'right') - 1) / 2
+    ranks /= max(n_users - 1, 1)
+    if invert is not None:
+        invert = np.asarray(invert, dtype=bool)
+        ranks[:, invert] = 1.0 - ranks[:, invert]
+    
+    # 一次分组归约：以 (label, feature) 展平后的下标做 bincount
+    flat_index = (labels[:, None] * n_features + np.arange(n_features)).ravel()
+    sums = np.bincount(flat_index, weights=ranks.ravel(),
+                       minlength=n_clusters * n_features).reshape(n_clusters, n_features)
+    sizes = np.bincount(labels, minlength=n_clusters)
+    profiles = sums / np.maximum(sizes, 1)[:, None]
+    
+    return profiles, sizes
+
+def generate_kmeans_clustering(compact=True, model_path=None):
+    """
+    生成K-means聚类结果散点图
+    
+    model_path 不为空时，同时把标准化参数与聚类中心保存为分群模型
+    （见 segment_model.py），供两次训练之间为新用户打标签。
+    """
+    setup_english_fonts()
+    
+    # 生成RFM数据
+    rfm_df, cluster_centers = generate_user_features(compact=compact)
+    
+    # 标准化并应用K-means聚类，同时计算轮廓系数
+    clusters, cluster_centers_original, silhouette_avg, (mean, scale) = cluster_users(rfm_df, compact=compact)
     rfm_df['Cluster'] = clusters
     
-    # 计算轮廓系数
-    silhouette_avg = silhouette_score(rfm_scaled, clusters)
+    if model_path:
+        from segment_model import SegmentModel
+        SegmentModel.from_original_centers(RFM_COLUMNS, mean, scale, cluster_centers_original).save(model_path)
+        print(f"✅ 分群模型已保存: {model_path}")
     
     # 创建聚类结果图
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
@@ -89,7 +256,6 @@ def generate_kmeans_clustering():
                        c=colors[i], label=f'Cluster {i+1}', alpha=0.7, s=30)
     
     # 标记K-means中心点
-    cluster_centers_original = scaler.inverse_transform(kmeans.cluster_centers_)
     for i, center in enumerate(cluster_centers_original):
         axes[1].scatter(center[0], center[2], c=colors[i], marker='D', s=150, 
                        edgecolors='black', linewidth=1)
@@ -108,23 +274,26 @@ def generate_kmeans_clustering():
     plt.close()
     print("✅ K-means聚类结果图已生成: docs/clustering/kmeans_clustering.png")
 
-def generate_radar_chart():
+def generate_radar_chart(compact=True):
     """生成分群用户特征雷达图"""
     setup_english_fonts()
     
-    # 生成聚类数据
-    np.random.seed(42)
+    # 使用与聚类图相同的数据与模型，计算真实分群画像
+    rfm_df, _ = generate_user_features(compact=compact)
+    clusters, _, _, _ = cluster_users(rfm_df, compact=compact)
+    
+    profiles, sizes = compute_cluster_profiles(
+        feature_matrix(rfm_df, [column for _, column, _ in PROFILE_FEATURES]),
+        clusters, n_clusters=4,
+        invert=[inverted for _, _, inverted in PROFILE_FEATURES])
     
-    # 定义4个用户群体的特征
+    categories = [name for name, _, _ in PROFILE_FEATURES]
     cluster_profiles = {
-        'High Value': {'R': 0.9, 'F': 0.95, 'M': 0.98, 'Activity': 0.92, 'Loyalty': 0.88},
-        'Loyal': {'R': 0.85, 'F': 0.9, 'M': 0.85, 'Activity': 0.88, 'Loyalty': 0.95},
-        'Regular': {'R': 0.6, 'F': 0.7, 'M': 0.65, 'Activity': 0.75, 'Loyalty': 0.6},
-        'Churn Risk': {'R': 0.3, 'F': 0.4, 'M': 0.35, 'Activity': 0.45, 'Loyalty': 0.25}
+        f'Cluster {i+1} (n={sizes[i]})': dict(zip(categories, profiles[i]))
+        for i in range(len(profiles))
     }
     
     # 雷达图设置
-    categories = list(cluster_profiles['High Value'].keys())
     N = len(categories)
     
     # 计算角度
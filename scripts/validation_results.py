@@ -11,6 +11,16 @@ import numpy as np
 import pandas as pd
 import os
 
+from uplift_analysis import METRIC_NAMES, compute_strategy_uplift
+
+# 策略在图表中的完整名称
+STRATEGY_LABELS = {
+    'Personalized': 'Personalized\nRecommendation',
+    'Popular': 'Popular\nContent',
+    'Time-based': 'Time-based\nPush',
+    'RFM-based': 'RFM-based\nTargeting',
+}
+
 def setup_english_fonts():
     """设置英文字体"""
     plt.rcParams['font.family'] = 'DejaVu Sans'
@@ -82,30 +92,64 @@ def generate_retention_curves():
     plt.close()
     print("✅ 用户留存曲线图已生成: docs/validation/retention_curves.png")
 
-def generate_strategy_comparison():
+def simulate_assignment_logs(n_users_per_strategy=20000, seed=42):
+    """模拟各策略实验的分组日志（实验组/对照组各半）"""
+    rng = np.random.default_rng(seed)
+    
+    # 各策略在参与度、留存、收入上的真实提升幅度
+    true_lifts = {
+        'Personalized': (0.35, 0.28, 0.40),
+        'Popular': (0.22, 0.15, 0.25),
+        'Time-based': (0.18, 0.12, 0.20),
+        'RFM-based': (0.42, 0.38, 0.55),
+    }
+    
+    frames = []
+    for strategy, (engagement_lift, retention_lift, revenue_lift) in true_lifts.items():
+        treatment = rng.random(n_users_per_strategy) < 0.5
+        engagement = rng.lognormal(3.5, 0.8, n_users_per_strategy) * np.where(treatment, 1 + engagement_lift, 1)
+        retention = rng.random(n_users_per_strategy) < 0.4 * np.where(treatment, 1 + retention_lift, 1)
+        paying = rng.random(n_users_per_strategy) < 0.1
+        revenue = paying * rng.lognormal(2.0, 1.0, n_users_per_strategy) * np.where(treatment, 1 + revenue_lift, 1)
+        frames.append(pd.DataFrame({
+            'strategy': strategy,
+            'treatment': treatment,
+            'engagement': engagement,
+            'retention': retention.astype(float),
+            'revenue': revenue,
+        }))
+    
+    return pd.concat(frames, ignore_index=True)
+
+def generate_strategy_comparison(logs=None, n_resamples=2000):
     """生成策略效果对比图"""
     setup_english_fonts()
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
     
-    # 策略对比数据
-    strategies = ['Personalized\nRecommendation', 'Popular\nContent', 'Time-based\nPush', 'RFM-based\nTargeting']
+    # 由实验分组日志计算提升率及置信区间
+    if logs is None:
+        logs = simulate_assignment_logs()
+    uplift = compute_strategy_uplift(logs['strategy'], logs['treatment'],
+                                     logs[METRIC_NAMES], n_resamples=n_resamples)
     
-    # 不同指标的效果对比
-    engagement_improvement = [35, 22, 18, 42]  # 参与度提升
-    retention_improvement = [28, 15, 12, 38]   # 留存率提升
-    revenue_increase = [40, 25, 20, 55]        # 收入增长
+    strategy_order = list(dict.fromkeys(logs['strategy']))
+    strategies = [STRATEGY_LABELS.get(name, name) for name in strategy_order]
     
     x_pos = np.arange(len(strategies))
     width = 0.25
     
-    # 绘制柱状图对比
-    ax1.bar(x_pos - width, engagement_improvement, width, label='Engagement Improvement', 
-            color='#4CAF50', alpha=0.8)
-    ax1.bar(x_pos, retention_improvement, width, label='Retention Improvement', 
-            color='#2196F3', alpha=0.8)
-    ax1.bar(x_pos + width, revenue_increase, width, label='Revenue Increase', 
-            color='#FF9800', alpha=0.8)
+    # 绘制柱状图对比（误差线为 bootstrap 置信区间）
+    bar_styles = [
+        ('engagement', 'Engagement Improvement', '#4CAF50'),
+        ('retention', 'Retention Improvement', '#2196F3'),
+        ('revenue', 'Revenue Increase', '#FF9800'),
+    ]
+    for offset, (metric, label, color) in zip([-width, 0, width], bar_styles):
+        rows = uplift[uplift['metric'] == metric].set_index('strategy').loc[strategy_order]
+        yerr = [rows['uplift'] - rows['ci_low'], rows['ci_high'] - rows['uplift']]
+        ax1.bar(x_pos + offset, rows['uplift'], width, yerr=yerr, capsize=3,
+                label=label, color=color, alpha=0.8)
     
     ax1.set_xlabel('Marketing Strategies', fontsize=12)
     ax1.set_ylabel('Improvement Rate (%)', fontsize=12)
@@ -116,15 +160,13 @@ def generate_strategy_comparison():
     ax1.grid(True, alpha=0.3, axis='y')
     
     # 绘制策略效果雷达图
-    metrics = ['Engagement', 'Retention', 'Revenue', 'Satisfaction', 'Cost Efficiency']
-    
-    # 不同策略在各指标上的得分
-    strategy_scores = {
-        'Personalized': [8, 7, 9, 8, 6],
-        'Popular': [6, 5, 7, 6, 8],
-        'Time-based': [5, 4, 6, 5, 7],
-        'RFM-based': [9, 8, 9, 8, 7]
-    }
+    metrics = [metric.capitalize() for metric in METRIC_NAMES]
+    
+    # 不同策略在各指标上的得分：提升率按该指标最优策略折算为 0-10 分
+    table = uplift.pivot(index='strategy', columns='metric', values='uplift').loc[strategy_order, METRIC_NAMES]
+    best = table.max(axis=0).where(lambda x: x > 0)
+    scores_table = (table.clip(lower=0) / best * 10).fillna(0)
+    strategy_scores = {name: scores_table.loc[name].tolist() for name in strategy_order}
     
     # 雷达图设置
     angles = np.linspace(0, 2*np.pi, len(metrics), endpoint=False).tolist()
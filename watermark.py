@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输入分区水位线（增量运行）
+
+每个阶段成功后记录它消费过的分区、各分区的文件指纹（大小 + 修改时间）、
+阶段命令（argv、工作目录与显式设置的环境变量）的哈希，以及阶段上报的最大事件时间。
+再次运行时只有出现新分区、分区内容变化或删除、命令参数变化或上游阶段需要重跑的阶段才执行，
+并通过环境变量告知阶段需要处理的分区；其余阶段标记为已是最新：
+- PIPELINE_PARTITIONS：新增或内容变化的分区（逗号分隔）
+- PIPELINE_REMOVED_PARTITIONS：已删除的分区（逗号分隔）
+- PIPELINE_REPORT：阶段可把 {"max_event_time": "..."} 写入该 JSON 文件，成功后记入水位线
+
+状态保存为 JSON（先写临时文件再原子替换），示例：
+    {"cleaning": {"partitions": {"dt=2025-10-21": {"size": 1024, "mtime_ns": ..., "files": 2}},
+                  "command": "3f2a...", "max_event_time": "2025-10-21T23:59:58",
+                  "updated_at": "2025-10-22T03:00:00"}}
+"""
+
+import datetime
+import hashlib
+import json
+import os
+
+from pipeline_runner import SUCCESS
+
+PARTITIONS_ENV = 'PIPELINE_PARTITIONS'
+REMOVED_ENV = 'PIPELINE_REMOVED_PARTITIONS'
+REPORT_ENV = 'PIPELINE_REPORT'
+
+def fingerprint(path):
+    """文件或目录（递归）的指纹：总大小、最新修改时间、文件数"""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'files': 1}
+    size, mtime_ns, files = 0, 0, 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            if name.startswith(('.', '_')):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            size += stat.st_size
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+            files += 1
+    return {'size': size, 'mtime_ns': mtime_ns, 'files': files}
+
+def discover_partitions(root):
+    """
+    列出输入根目录下的分区及其指纹
+
+    分区为 root 下的一级子目录（如 dt=2025-10-21）或文件；以 . 或 _ 开头的忽略。
+
+    Returns:
+        {分区名: 指纹}
+    """
+    if not os.path.isdir(root):
+        return {}
+    return {name: fingerprint(os.path.join(root, name))
+            for name in sorted(os.listdir(root)) if not name.startswith(('.', '_'))}
+
+def command_hash(stage):
+    """
+    阶段命令的哈希：argv、工作目录与显式设置的环境变量
+
+    环境变量只计入 stage.env 中显式给出的部分（不含本模块设置的分区变量），
+    继承自父进程的环境不参与比较。须在 plan_incremental 修改 stage.env 之前计算。
+    """
+    env = {key: value for key, value in (stage.env or {}).items()
+           if key not in (PARTITIONS_ENV, REMOVED_ENV, REPORT_ENV)}
+    payload = json.dumps({'argv': stage.argv, 'cwd': stage.cwd, 'env': env}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class WatermarkStore:
+    """各阶段水位线的 JSON 存储"""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def stage(self, name):
+        return self.state.get(name)
+
+    def report_path(self, name):
+        """阶段上报最大事件时间等信息的 JSON 文件路径"""
+        return f"{self.path}.{name}.report.json"
+
+    def pending(self, name, partitions):
+        """
+        与已记录的水位线比较
+
+        Returns:
+            changed: 新增或指纹变化的分区
+            removed: 已记录但当前不存在的分区
+        """
+        recorded = (self.state.get(name) or {}).get('partitions', {})
+        changed = [p for p, fp in partitions.items() if recorded.get(p) != fp]
+        removed = [p for p in recorded if p not in partitions]
+        return changed, removed
+
+    def record(self, name, partitions, command=None, max_event_time=None):
+        """记录阶段已消费的分区、命令哈希与最大事件时间（覆盖原有记录）"""
+        self.state[name] = {
+            'partitions': dict(partitions),
+            'command': command,
+            'max_event_time': max_event_time,
+            'updated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def plan_incremental(stages, store, inputs):
+    """
+    根据水位线决定哪些阶段需要运行
+
+    阶段在以下情况下需要运行：从未成功过；自身输入有新增/变化/删除的分区；
+    命令哈希与上次记录的不同（如参考日期变化）；或任一（本次运行中的）上游阶段需要运行。
+    没有自身输入的阶段继承上游的输入（上游不在本次运行中时，取其已记录的分区）。
+    需要运行的阶段通过环境变量获得新增/变化与已删除的分区以及上报文件路径，
+    无需运行的阶段设置 skip，由执行器标记为已是最新。
+
+    Args:
+        stages: Stage 列表（依赖只引用排在前面的阶段）
+        store: WatermarkStore
+        inputs: {阶段名: {分区名: 指纹}}，通常只给入口阶段
+
+    Returns:
+        {阶段名: {'partitions': 有效输入分区, 'command': 命令哈希}}，供运行后 record_results 使用
+    """
+    plan = {}
+    dirty = set()
+    for stage in stages:
+        partitions = dict(inputs.get(stage.name, {}))
+        for name in stage.depends_on:
+            if name in plan:
+                partitions.update(plan[name]['partitions'])
+            else:
+                partitions.update((store.stage(name) or {}).get('partitions', {}))
+        command = command_hash(stage)
+        plan[stage.name] = {'partitions': partitions, 'command': command}
+
+        recorded = store.stage(stage.name)
+        changed, removed = store.pending(stage.name, partitions)
+        upstream_dirty = any(name in dirty for name in stage.depends_on)
+        if recorded is None or changed or removed or upstream_dirty or recorded.get('command') != command:
+            dirty.add(stage.name)
+            report = store.report_path(stage.name)
+            if os.path.exists(report):
+                os.remove(report)
+            env = dict(stage.env if stage.env is not None else os.environ)
+            env[PARTITIONS_ENV] = ','.join(changed)
+            env[REMOVED_ENV] = ','.join(removed)
+            env[REPORT_ENV] = report
+            stage.env = env
+        else:
+            stage.skip = "输入分区与命令均无变化"
+    return plan
+
+def _read_report(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def record_results(results, store, plan):
+    """把本次成功运行的阶段（连同阶段上报的最大事件时间）写入水位线并保存"""
+    for name, result in results.items():
+        if result.status == SUCCESS and name in plan:
+            report = _read_report(store.report_path(name))
+            store.record(name, plan[name]['partitions'], plan[name]['command'],
+                         report.get('max_event_time'))
+    store.save()